@@ -1,260 +1,365 @@
-import io
+import hashlib
+import os
 
 import emoji
-import nltk
+import pandas as pd
 import streamlit as st
-from langdetect import detect
 
-from src.data import (get_basic_infos, get_maximal_silence_period,
-                      get_mean_media_interval, get_mean_message_len,
-                      get_moving_average_nb_message, get_number_of_message,
-                      get_questions_by_name)
-from src.preprocessing import get_data_from_txt
+from src.data import (detect_language, get_basic_infos,
+                      get_maximal_silence_period, get_mean_media_interval,
+                      get_mean_message_len, get_moving_average_nb_message,
+                      get_number_of_message, get_questions_by_name)
+from src.formats import load_formats, sniff_format
+from src.preprocessing import fit_memory_budget, get_data_from_buffer
+from src.profiling import (enable_memory_accounting, get_timings,
+                           profile_run, stage, timings_to_json)
 from src.viz import (plot_daily_data, plot_emoji_data, plot_hourly_data,
                      plot_monthly_data, plot_moving_nb_messages,
                      plot_moving_nb_messages_individuals,
                      plot_percentage_msg_emoji, plot_wordcloud)
 
-# NLTK dependencies
-nltk.download('punkt')
-nltk.download('stopwords')
-
-
-# Page configuration
-st.set_page_config(layout="centered",
-                   page_icon="💬",
-                   page_title="Whatsapp Group Analyzer")
-col1, col2, col3 = st.columns([1, 1, 1])
-col2.image("./assets/whatsapp_logo.png", use_column_width=True)
-st.markdown("<h1 style='text-align: center;'>Whatsapp Group Analyzer</h1>",
-            unsafe_allow_html=True)
-
-
-# Sidebar
-st.sidebar.title("Whatsapp Group Analyzer")
-st.sidebar.text(emoji.emojize("Created by Arnaud Trog."))
-
-st.sidebar.write(emoji.emojize("Import a group conversation and analyze it with the power of Python & data viz !"
-                               " Features included are : emoji analyzer, temporal analysis, user activities and much more."))
-
-
-# Data configuration
-option = st.sidebar.selectbox(
-    'What type of date format ?',
-    (emoji.emojize(f"{emoji.emojize(':France:')} : 01/02/2016 à 15:30"),
-     emoji.emojize(f"{emoji.emojize(':United_States:')} : 02/01/16, 15:30"))
-)
-
-# '01/02/2016 à 15:30':
-if option == emoji.emojize(f"{emoji.emojize(':France:')} : 01/02/2016 à 15:30"):
-    date_format = '%d/%m/%Y à %H:%M'
-    header = r"(\d{2}/\d{2}/\d{4} à \d{2}:\d{2} - )"
-# "02/01/16, 15:30":
-elif option == emoji.emojize(f"{emoji.emojize(':United_States:')} : 02/01/16, 15:30"):
-    date_format = '%m/%d/%y, %H:%M'
-    header = r"(\d{1,2}/\d{1,2}/\d{2}, \d{2}:\d{2} - )"
-else:
-    pass
-
-# Get raw data
-uploaded_file = st.sidebar.file_uploader(
-    "Choose a Whatsapp group conversation")
-
-
-# How to export conversation to analyze
-with st.sidebar.expander(emoji.emojize(":red_question_mark: How to export WhatsApp chat")):
-    """
-    1. Open Whatsapp on your phone 
-    2. Click on the desired conversation
-    3. Open the menu with the three dots
-    4. Click on «Export data» and select without media
-    """
-st.sidebar.write("")
-
-
-# Main page
-if uploaded_file is not None:
-    # Get pre-processed data from uploaded file
-    bytes_data = uploaded_file.getvalue()
-    txt_file = bytes_data.decode("utf-8")
-    txt_file = io.StringIO(txt_file)
-    data = get_data_from_txt(txt_file, header, date_format)
-    detected_language = detect(" ".join(data["message"]))
-
-    # Detect the language in the conversation
-    if detected_language == "fr":
-        language = "french"
-        media_message = "<Médias omis>"
-    elif detected_language == "en":
-        language = "english"
-        media_message = "<Media omitted>"
-    else:
-        pass
-
-    # Create all sub-pages
-    tab1, tab2, tab3, tab4, tab5 = st.tabs(
-        ["Overall statistics", "Emoji", "Temporal", "Activity", "Words"])
-
-    # First sub-page : Overall statistics
-    with tab1:
-        # Global information about the conversation
-        st.markdown(
-            f"<p style='text-align: center; font-size: 17px; font-weight: bold;'> {emoji.emojize('Overall statistics')} </p>",
-            unsafe_allow_html=True)
-        infos = get_basic_infos(data, media_message)
-        st.write(emoji.emojize(
-            f":play_button: Conversation starting from : {infos['start_date']}"))
-        st.write(emoji.emojize(
-            f":stop_button: Until to : {infos['end_date']}"))
-        st.write(emoji.emojize(
-            f":speaking_head: Number of participants : {infos['n_authors']}"))
-        st.write(emoji.emojize(
-            f":speech_balloon: Total number of messages : {infos['n_messages']}"))
-
-        # Who ask questions the most
-        st.markdown('----')
-        with st.container():
-            st.markdown(
-                f"<p style='text-align: center; font-size: 17px; font-weight: bold;'> {emoji.emojize('Biggest questioner :thinking_face:')} </p>",
-                unsafe_allow_html=True)
-            questions = get_questions_by_name(data)
-            first, second, third = list(questions.items())[:3]
+# Results kept across reruns, for a few conversations and a limited time
+CACHE_MAX_ENTRIES = 16
+CACHE_TTL = 3600  # 1 hour
 
-            st.write(emoji.emojize(
-                f":1st_place_medal: {first[0]} with {first[1]} questions"))
-            st.write(emoji.emojize(
-                f":2nd_place_medal: {second[0]} with {second[1]} questions"))
-            st.write(emoji.emojize(
-                f":3rd_place_medal: {third[0]} with {third[1]} questions"))
+# Under this confidence, the language of the date format is used
+LANGUAGE_MIN_CONFIDENCE = 0.5
 
-        # Who speaks the most
-        st.markdown('----')
-        with st.container():
-            st.markdown(
-                f"<p style='text-align: center; font-size: 17px; font-weight: bold;'> {emoji.emojize('Most talkative :loudspeaker:')} </p>",
-                unsafe_allow_html=True)
-            msg_per_author = get_number_of_message(data)
-            msg_len_per_author = get_mean_message_len(data)
+SECTIONS = ("Overall statistics", "Emoji", "Temporal", "Activity", "Words")
 
-            first, second, third = list(msg_per_author.items())[:3]
-            st.write(emoji.emojize(
-                f":1st_place_medal: {first[0]} with {first[1]} messages and an average message size of {int(msg_len_per_author[first[0]])} characters"))
-            st.write(emoji.emojize(
-                f":2nd_place_medal: {second[0]} with {second[1]} messages and an average message size of {int(msg_len_per_author[second[0]])} characters"))
-            st.write(emoji.emojize(
-                f":3rd_place_medal: {third[0]} with {third[1]} messages and an average message size of {int(msg_len_per_author[third[0]])} characters"))
+# Opt-in diagnostics : a cProfile dump in PROFILE_DIR and a JSON line
+# of stage timings in PERFORMANCE_LOG for each run
+PROFILE_DIR = os.environ.get("PROFILE_DIR")
+PERFORMANCE_LOG = os.environ.get("PERFORMANCE_LOG")
+if os.environ.get("MEMORY_ACCOUNTING"):
+    enable_memory_accounting()
 
-        # Who had the longest period without a message
-        st.markdown('----')
-        with st.container():
-            st.markdown(
-                f"<p style='text-align: center; font-size: 17px; font-weight: bold;'> {emoji.emojize('Most silent :shushing_face:')} </p>", unsafe_allow_html=True)
+# Memory allowed to analyze a conversation (e.g. the container limit),
+# only the most recent messages of larger conversations are analyzed
+MEMORY_BUDGET = (int(os.environ["MEMORY_BUDGET_MB"]) * 1024 ** 2
+                 if "MEMORY_BUDGET_MB" in os.environ else None)
 
-            silence_per_author = get_maximal_silence_period(data)
 
-            first, second, third = list(silence_per_author.items())[:3]
-            st.write(emoji.emojize(
-                f":1st_place_medal: {first[0]} with {first[1]} of silence."))
-            st.write(emoji.emojize(
-                f":2nd_place_medal: {second[0]} with {second[1]} of silence."))
-            st.write(emoji.emojize(
-                f":3rd_place_medal: {third[0]} with {third[1]} of silence."))
+# Cached computations : the arguments starting with "_" are not hashed,
+# the conversation is identified by the hash of its content and its format
+@st.experimental_memo(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL)
+def load_conversation(key, header, date_format, _buffer):
+    return get_data_from_buffer(_buffer, header, date_format)
 
-        # Who sends the most media (photos, videos, ...)
-        st.markdown('----')
-        with st.container():
-            st.markdown(
-                f"<p style='text-align: center; font-size: 17px; font-weight: bold;'> {emoji.emojize('Most media sender :camera:')} </p>",
-                unsafe_allow_html=True)
 
-            media_intervals = get_mean_media_interval(data, media_message)
+@st.experimental_memo(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL)
+def detect_conversation_language(key, _data):
+    media_messages = {fmt["media_message"] for fmt in formats.values()}
+    return detect_language(_data, exclude=media_messages)
 
-            first, second, third = list(media_intervals.items())[:3]
-            st.write(emoji.emojize(
-                f":1st_place_medal: {first[0]} with media sent every {first[1]}."))
-            st.write(emoji.emojize(
-                f":2nd_place_medal: {second[0]} with media sent every {second[1]}."))
-            st.write(emoji.emojize(
-                f":3rd_place_medal: {third[0]} with media sent every {third[1]}."))
 
-    # Second sub-page : analysis of emoji usage
-    with tab2:
-        st.header("Emoji analysis")
+@st.experimental_memo(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL)
+def get_overall_statistics(key, media_message, _data):
+    return {"infos": get_basic_infos(_data, media_message),
+            "questions": get_questions_by_name(_data),
+            "messages": get_number_of_message(_data),
+            "message_lengths": get_mean_message_len(_data),
+            "silences": get_maximal_silence_period(_data),
+            "media_intervals": get_mean_media_interval(_data, media_message)}
 
-        # Graph with percentage of emoji usage
-        st.markdown('----')
-        with st.container():
-            st.markdown(
-                f"<p style='text-align: center; font-size: 17px; font-weight: bold;'> Most used emoji in the conversation </p>",
-                unsafe_allow_html=True)
-            fig = plot_emoji_data(data, show=False)
-            st.plotly_chart(fig, use_container_width=True)
 
-        # Graph of percentage of messages with one or more emoji for each participant
-        st.markdown('----')
-        with st.container():
-            st.markdown(
-                f"<p style='text-align: center; font-size: 17px; font-weight: bold;'> Who uses emoji the most ? </p>",
-                unsafe_allow_html=True)
-            fig = plot_percentage_msg_emoji(data, show=False)
-            st.pyplot(fig, use_container_width=True)
+@st.experimental_memo(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL)
+def get_emoji_figures(key, _data):
+    return (plot_emoji_data(_data, show=False),
+            plot_percentage_msg_emoji(_data, show=False))
 
-    # Third page : analysis of the periods when each participant sends the most messages
-    with tab3:
-        st.header("Temporal analysis")
 
-        option = st.selectbox(
-            'At which frequency do you want the analysis ?',
-            ('Hourly', 'Daily', 'Monthly'))
+@st.experimental_memo(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL)
+def get_temporal_figure(key, frequency, _data):
+    if frequency == "Hourly":
+        return plot_hourly_data(_data, show=False)
+    elif frequency == "Daily":
+        return plot_daily_data(_data, show=False)
+    return plot_monthly_data(_data, show=False)
 
-        st.markdown('----')
-        with st.container():
 
-            st.info("The graph below was made with Plotly and is interactive. "
-                    "You can single click on one member to remove him "
-                    "or double click to see only this member. "
-                    "The radius represents the percentage of message at this period.")
+@st.experimental_memo(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL)
+def get_activity_figures(key, window, _data):
+    data_tmp = get_moving_average_nb_message(_data, window=window)
+    return (plot_moving_nb_messages(data_tmp, show=False),
+            plot_moving_nb_messages_individuals(_data, show=False, window=window))
 
-            if option == "Hourly":
-                fig = plot_hourly_data(data, show=False)
-                st.plotly_chart(fig, use_container_width=True)
-            elif option == "Daily":
-                fig = plot_daily_data(data, show=False)
-                st.plotly_chart(fig, use_container_width=True)
-            elif option == "Monthly":
-                fig = plot_monthly_data(data, show=False)
-                st.plotly_chart(fig, use_container_width=True)
-            else:
-                st.write("not yet implemented")
 
-    # Fourth sub-page : global activity analysis
-    with tab4:
-        st.header("Activity analysis")
+@st.experimental_memo(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL)
+def get_wordcloud_figure(key, language, _data):
+    return plot_wordcloud(_data, language=language, show=False)
 
-        # Without participant specification
-        st.markdown('----')
-        with st.container():
-            st.markdown(
-                f"<p style='text-align: center; font-size: 17px; font-weight: bold;'> Moving number of messages per week (global) </p>",
+
+# Timings of this run only, the profiler is stopped even by st.stop
+with profile_run(PROFILE_DIR):
+
+    # Page configuration
+    st.set_page_config(layout="centered",
+                       page_icon="💬",
+                       page_title="Whatsapp Group Analyzer")
+    col1, col2, col3 = st.columns([1, 1, 1])
+    col2.image("./assets/whatsapp_logo.png", use_column_width=True)
+    st.markdown("<h1 style='text-align: center;'>Whatsapp Group Analyzer</h1>",
                 unsafe_allow_html=True)
-            data_tmp = get_moving_average_nb_message(data)
-            fig = plot_moving_nb_messages(data_tmp, show=False)
-            st.pyplot(fig, use_container_width=True)
 
-        # With participant specification
-        st.markdown('----')
-        with st.container():
+
+    # Sidebar
+    st.sidebar.title("Whatsapp Group Analyzer")
+    st.sidebar.text(emoji.emojize("Created by Arnaud Trog."))
+
+    st.sidebar.write(emoji.emojize("Import a group conversation and analyze it with the power of Python & data viz !"
+                                   " Features included are : emoji analyzer, temporal analysis, user activities and much more."))
+
+
+    # Data configuration
+    formats = load_formats()
+    format_labels = {emoji.emojize(f"{fmt['flag']} : {fmt['example']}"): name
+                     for name, fmt in formats.items()}
+    option = st.sidebar.selectbox(
+        'What type of date format ?',
+        ("Automatic detection", *format_labels)
+    )
+
+    # Get raw data
+    uploaded_file = st.sidebar.file_uploader(
+        "Choose a Whatsapp group conversation")
+
+
+    # How to export conversation to analyze
+    with st.sidebar.expander(emoji.emojize(":red_question_mark: How to export WhatsApp chat")):
+        """
+        1. Open Whatsapp on your phone 
+        2. Click on the desired conversation
+        3. Open the menu with the three dots
+        4. Click on «Export data» and select without media
+        """
+    st.sidebar.write("")
+
+
+    # Main page
+    if uploaded_file is not None:
+        # Get pre-processed data from uploaded file
+        buffer = uploaded_file.getbuffer()
+
+        # Get the date format of the conversation
+        if option in format_labels:
+            format_name = format_labels[option]
+            fmt = formats[format_name]
+        else:
+            with stage("app.detect_format"):
+                format_name, fmt = sniff_format(buffer, formats)
+        header, date_format = fmt["header"], fmt["date_format"]
+
+        # Expected memory of the analysis, from the size of the conversation
+        try:
+            offset = fit_memory_budget(buffer, header, MEMORY_BUDGET)
+        except ValueError as e:
+            st.error(str(e))
+            st.stop()
+        if offset > 0:
+            st.warning(f"This conversation is too large to be analyzed entirely, "
+                       f"only its last {100 * (1 - offset / len(buffer)):.0f}% "
+                       f"are analyzed.")
+            buffer = buffer[offset:]
+
+        with stage("app.hash_upload"):
+            key = f"{hashlib.sha256(buffer).hexdigest()}-{format_name}"
+        data = load_conversation(key, header, date_format, buffer)
+
+        # Detect the language in the conversation, for the media placeholder
+        # and the stop words
+        detected_language, confidence = detect_conversation_language(key, data)
+        languages = {fmt["locale"].split("_")[0]: fmt for fmt in formats.values()}
+        if confidence >= LANGUAGE_MIN_CONFIDENCE and detected_language in languages:
+            language = languages[detected_language]["language"]
+            media_message = languages[detected_language]["media_message"]
+        else:
+            language = fmt["language"]
+            media_message = fmt["media_message"]
+
+        # Only the selected sub-page is computed
+        section = st.radio("Section", SECTIONS, horizontal=True)
+
+        # First sub-page : Overall statistics
+        if section == "Overall statistics":
+            # Global information about the conversation
             st.markdown(
-                f"<p style='text-align: center; font-size: 17px; font-weight: bold;'> Moving number of messages per week (individual) </p>",
+                f"<p style='text-align: center; font-size: 17px; font-weight: bold;'> {emoji.emojize('Overall statistics')} </p>",
                 unsafe_allow_html=True)
-            fig = plot_moving_nb_messages_individuals(data, show=False)
+            statistics = get_overall_statistics(key, media_message, data)
+            infos = statistics["infos"]
+            st.write(emoji.emojize(
+                f":play_button: Conversation starting from : {infos['start_date']}"))
+            st.write(emoji.emojize(
+                f":stop_button: Until to : {infos['end_date']}"))
+            st.write(emoji.emojize(
+                f":speaking_head: Number of participants : {infos['n_authors']}"))
+            st.write(emoji.emojize(
+                f":speech_balloon: Total number of messages : {infos['n_messages']}"))
+
+            # Who ask questions the most
+            st.markdown('----')
+            with st.container():
+                st.markdown(
+                    f"<p style='text-align: center; font-size: 17px; font-weight: bold;'> {emoji.emojize('Biggest questioner :thinking_face:')} </p>",
+                    unsafe_allow_html=True)
+                questions = statistics["questions"]
+                first, second, third = list(questions.items())[:3]
+
+                st.write(emoji.emojize(
+                    f":1st_place_medal: {first[0]} with {first[1]} questions"))
+                st.write(emoji.emojize(
+                    f":2nd_place_medal: {second[0]} with {second[1]} questions"))
+                st.write(emoji.emojize(
+                    f":3rd_place_medal: {third[0]} with {third[1]} questions"))
+
+            # Who speaks the most
+            st.markdown('----')
+            with st.container():
+                st.markdown(
+                    f"<p style='text-align: center; font-size: 17px; font-weight: bold;'> {emoji.emojize('Most talkative :loudspeaker:')} </p>",
+                    unsafe_allow_html=True)
+                msg_per_author = statistics["messages"]
+                msg_len_per_author = statistics["message_lengths"]
+
+                first, second, third = list(msg_per_author.items())[:3]
+                st.write(emoji.emojize(
+                    f":1st_place_medal: {first[0]} with {first[1]} messages and an average message size of {int(msg_len_per_author[first[0]])} characters"))
+                st.write(emoji.emojize(
+                    f":2nd_place_medal: {second[0]} with {second[1]} messages and an average message size of {int(msg_len_per_author[second[0]])} characters"))
+                st.write(emoji.emojize(
+                    f":3rd_place_medal: {third[0]} with {third[1]} messages and an average message size of {int(msg_len_per_author[third[0]])} characters"))
+
+            # Who had the longest period without a message
+            st.markdown('----')
+            with st.container():
+                st.markdown(
+                    f"<p style='text-align: center; font-size: 17px; font-weight: bold;'> {emoji.emojize('Most silent :shushing_face:')} </p>", unsafe_allow_html=True)
+
+                silence_per_author = statistics["silences"]
+
+                first, second, third = list(silence_per_author.items())[:3]
+                st.write(emoji.emojize(
+                    f":1st_place_medal: {first[0]} with {first[1]} of silence."))
+                st.write(emoji.emojize(
+                    f":2nd_place_medal: {second[0]} with {second[1]} of silence."))
+                st.write(emoji.emojize(
+                    f":3rd_place_medal: {third[0]} with {third[1]} of silence."))
+
+            # Who sends the most media (photos, videos, ...)
+            st.markdown('----')
+            with st.container():
+                st.markdown(
+                    f"<p style='text-align: center; font-size: 17px; font-weight: bold;'> {emoji.emojize('Most media sender :camera:')} </p>",
+                    unsafe_allow_html=True)
+
+                media_intervals = statistics["media_intervals"]
+
+                first, second, third = list(media_intervals.items())[:3]
+                st.write(emoji.emojize(
+                    f":1st_place_medal: {first[0]} with media sent every {first[1]}."))
+                st.write(emoji.emojize(
+                    f":2nd_place_medal: {second[0]} with media sent every {second[1]}."))
+                st.write(emoji.emojize(
+                    f":3rd_place_medal: {third[0]} with media sent every {third[1]}."))
+
+        # Second sub-page : analysis of emoji usage
+        elif section == "Emoji":
+            st.header("Emoji analysis")
+
+            # Graph with percentage of emoji usage
+            emoji_fig, percentage_fig = get_emoji_figures(key, data)
+            st.markdown('----')
+            with st.container():
+                st.markdown(
+                    f"<p style='text-align: center; font-size: 17px; font-weight: bold;'> Most used emoji in the conversation </p>",
+                    unsafe_allow_html=True)
+                st.plotly_chart(emoji_fig, use_container_width=True)
+
+            # Graph of percentage of messages with one or more emoji for each participant
+            st.markdown('----')
+            with st.container():
+                st.markdown(
+                    f"<p style='text-align: center; font-size: 17px; font-weight: bold;'> Who uses emoji the most ? </p>",
+                    unsafe_allow_html=True)
+                st.pyplot(percentage_fig, use_container_width=True)
+
+        # Third page : analysis of the periods when each participant sends the most messages
+        elif section == "Temporal":
+            st.header("Temporal analysis")
+
+            option = st.selectbox(
+                'At which frequency do you want the analysis ?',
+                ('Hourly', 'Daily', 'Monthly'))
+
+            st.markdown('----')
+            with st.container():
+
+                st.info("The graph below was made with Plotly and is interactive. "
+                        "You can single click on one member to remove him "
+                        "or double click to see only this member. "
+                        "The radius represents the percentage of message at this period.")
+
+                fig = get_temporal_figure(key, option, data)
+                st.plotly_chart(fig, use_container_width=True)
+
+        # Fourth sub-page : global activity analysis
+        elif section == "Activity":
+            st.header("Activity analysis")
+
+            window = st.slider(
+                'Over how many days do you want to count the messages ?',
+                min_value=1, max_value=90, value=7)
+
+            # Without participant specification
+            global_fig, individual_fig = get_activity_figures(key, window, data)
+            st.markdown('----')
+            with st.container():
+                st.markdown(
+                    f"<p style='text-align: center; font-size: 17px; font-weight: bold;'> Moving number of messages per {window} days (global) </p>",
+                    unsafe_allow_html=True)
+                st.pyplot(global_fig, use_container_width=True)
+
+            # With participant specification
+            st.markdown('----')
+            with st.container():
+                st.markdown(
+                    f"<p style='text-align: center; font-size: 17px; font-weight: bold;'> Moving number of messages per {window} days (individual) </p>",
+                    unsafe_allow_html=True)
+                st.pyplot(individual_fig, use_container_width=True)
+
+        # Fifth sub-page : analysis of natural language
+        elif section == "Words":
+            st.header("Natural language analysis")
+            st.info("The graph below represents the most used words in the conversation."
+                    " The size of the words is proportional to its frequency after removing stop words"
+                    " (i.e. common / useless words).")
+            fig = get_wordcloud_figure(key, language, data)
             st.pyplot(fig, use_container_width=True)
 
-    # Fifth sub-page : analysis of natural language
-    with tab5:
-        st.header("Natural language analysis")
-        st.info("The graph below represents the most used words in the conversation."
-                " The size of the words is proportional to its frequency after removing stop words"
-                " (i.e. common / useless words).")
-        fig = plot_wordcloud(data, language=language, show=False)
-        st.pyplot(fig, use_container_width=True)
+
+# Performance of this run : only the stages computed, not read from the cache
+timings = get_timings()
+if PERFORMANCE_LOG is not None and timings:
+    with open(PERFORMANCE_LOG, "a") as f:
+        f.write(timings_to_json(timings) + "\n")
+
+with st.sidebar.expander("Performance"):
+    if timings:
+        performance = pd.DataFrame.from_dict(timings, orient="index")
+        performance["time"] = (performance["time"] * 1000).round(1)
+        for column in ("peak_memory", "retained_memory", "peak_rss"):
+            if column in performance:
+                performance[column] = (performance[column] / 1024 ** 2).round(1)
+        performance = performance.rename(columns={
+            "time": "time (ms)",
+            "peak_memory": "peak memory (MB)",
+            "retained_memory": "retained memory (MB)",
+            "peak_rss": "process peak RSS (MB)"})
+        st.dataframe(performance.sort_values("time (ms)", ascending=False))
+        if "process peak RSS (MB)" in performance:
+            st.caption("The peak and retained memory are traced by tracemalloc, "
+                       "without the Arrow buffers of the messages : the peak "
+                       "RSS of the process includes them.")
+    else:
+        st.write("Everything was read from the cache.")
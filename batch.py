@@ -0,0 +1,194 @@
+"""
+Analyze WhatsApp group conversations without the web application
+
+For each conversation file, the statistics of the application are written
+to <output>/<conversation>.json as soon as they are computed, and gathered in
+<output>/conversations.parquet (one row per conversation) and
+<output>/authors.parquet (one row per participant of each conversation).
+Conversations are named by their path relative to the common directory of
+the files, without extension. Files which cannot be analyzed are reported
+and skipped.
+
+Usage : python batch.py data/ "exports/*.txt" --output results/
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from src.data import (ENGINES, get_author_stats, get_basic_infos,
+                      get_maximal_silence_period, get_mean_media_interval,
+                      get_mean_message_len, get_media_interval_stats,
+                      get_number_of_message, get_questions_by_name,
+                      percentage_msg_with_emoji)
+from src.formats import sniff_format
+from src.preprocessing import read_data
+
+
+def find_files(inputs):
+    """List the conversation files given directories or glob patterns"""
+    files = set()
+
+    for _input in inputs:
+        if os.path.isdir(_input):
+            files.update(glob.glob(os.path.join(_input, "*.txt")))
+        else:
+            files.update(glob.glob(_input))
+    return sorted(files)
+
+
+def get_conversation_names(files):
+    """
+    Unique name of each conversation file, its path relative to the common
+    directory of the files without extension (e.g. "family/2022")
+    """
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(_path))
+                               for _path in files])
+    return {_path: os.path.splitext(
+        os.path.relpath(os.path.abspath(_path), root))[0].replace(os.sep, "/")
+        for _path in files}
+
+
+def analyze_conversation(path, name=None, cache_dir=None, memory_budget=None,
+                         engine="pandas"):
+    """
+    Compute the statistics of a conversation file
+
+    Parameters
+    ----------
+    path: str
+        Path of the conversation file
+    name: str
+        Name of the conversation in the results, file name without
+        extension if None
+    cache_dir: str
+        Directory where parsed conversations are cached, no cache if None
+    memory_budget: int
+        Maximal memory in bytes to analyze the conversation, larger
+        conversations are rejected. No limit if None
+    engine: str
+        Engine computing the statistics, one of src.data.ENGINES
+
+    Returns
+    -------
+    metrics: dict
+        Statistics of the conversation, with one dict per statistic
+        for the participants
+    authors: pd.DataFrame
+        Statistics of each participant, one row per participant
+    """
+    format_name, fmt = sniff_format(path)
+    media_message = fmt["media_message"]
+
+    data = read_data(os.path.dirname(path), os.path.basename(path),
+                     fmt["header"], fmt["date_format"], cache_dir=cache_dir,
+                     memory_budget=memory_budget, downgrade=False)
+    if data.empty:
+        raise ValueError("No message found (only events or wrong format)")
+    if name is None:
+        name = os.path.splitext(os.path.basename(path))[0]
+
+    metrics = {"conversation": name, "format": format_name}
+    metrics.update(get_basic_infos(data, media_message, engine))
+    metrics["questions"] = get_questions_by_name(data, engine)
+    metrics["messages"] = get_number_of_message(data, engine)
+    metrics["mean_message_len"] = get_mean_message_len(data, engine)
+    metrics["percentage_msg_with_emoji"] = percentage_msg_with_emoji(data,
+                                                                     engine)
+    metrics["maximal_silence_period"] = get_maximal_silence_period(data,
+                                                                   engine)
+    metrics["mean_media_interval"] = get_mean_media_interval(
+        data, media_message, engine=engine)
+
+    media_intervals = get_media_interval_stats(data, media_message,
+                                               engine=engine)
+    authors = get_author_stats(data, engine).join(
+        media_intervals.add_prefix("media_interval_"))
+    authors = authors.reset_index()
+    authors["author"] = authors["author"].astype(str)
+    authors.insert(0, "conversation", name)
+    return metrics, authors
+
+
+def write_metrics(output, metrics):
+    """Write the statistics of a conversation in <output>/<name>.json"""
+    _path = os.path.join(output, metrics["conversation"] + ".json")
+    os.makedirs(os.path.dirname(_path), exist_ok=True)
+    with open(_path, "w") as f:
+        json.dump(metrics, f, indent=2, ensure_ascii=False, default=str)
+
+
+def write_tables(output, conversations, authors):
+    """Gather the statistics of the conversations in Parquet files"""
+    if not conversations:
+        return
+    conversations = pd.DataFrame(conversations).sort_values("conversation")
+    conversations.to_parquet(
+        os.path.join(output, "conversations.parquet"), index=False)
+    authors = pd.concat(authors, axis=0, ignore_index=True)
+    authors.sort_values(["conversation", "author"]).to_parquet(
+        os.path.join(output, "authors.parquet"), index=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Analyze WhatsApp group conversations without the web application")
+    parser.add_argument("inputs", nargs="+",
+                        help="Directories of .txt exports or glob patterns")
+    parser.add_argument("-o", "--output", default="results",
+                        help="Directory where the statistics are written")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="Number of processes, number of CPUs by default")
+    parser.add_argument("--cache-dir", default=None,
+                        help="Directory where parsed conversations are cached")
+    parser.add_argument("--memory-budget", type=int, default=None,
+                        help="Maximal memory in MB to analyze a conversation")
+    parser.add_argument("--engine", default="pandas", choices=ENGINES,
+                        help="Engine computing the statistics")
+    args = parser.parse_args(argv)
+    memory_budget = (args.memory_budget * 1024 ** 2
+                     if args.memory_budget is not None else None)
+
+    files = find_files(args.inputs)
+    if not files:
+        parser.error("no conversation file found")
+    os.makedirs(args.output, exist_ok=True)
+
+    names = get_conversation_names(files)
+    conversations, authors, failures = [], [], []
+
+    # The results collected so far are written even if the run is interrupted
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            futures = {executor.submit(analyze_conversation, path,
+                                       names[path], args.cache_dir,
+                                       memory_budget, args.engine): path
+                       for path in files}
+
+            for future in as_completed(futures):
+                try:
+                    metrics, _authors = future.result()
+                except Exception as e:
+                    print(f"{futures[future]}: {type(e).__name__}: {e}",
+                          file=sys.stderr)
+                    failures.append(futures[future])
+                    continue
+
+                write_metrics(args.output, metrics)
+                conversations.append({k: v for k, v in metrics.items()
+                                      if not isinstance(v, dict)})
+                authors.append(_authors)
+                print(f"{futures[future]}: {metrics['n_messages']} messages")
+    finally:
+        write_tables(args.output, conversations, authors)
+
+    if failures:
+        sys.exit(f"{len(failures)} of {len(files)} conversations failed")
+
+
+if __name__ == "__main__":
+    main()
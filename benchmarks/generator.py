@@ -0,0 +1,182 @@
+"""
+Seeded generator of synthetic WhatsApp group exports
+
+Usage : python -m benchmarks.generator conversation.txt -n 100000 --format us
+"""
+import argparse
+import random
+from datetime import datetime, timedelta
+
+from src.formats import load_formats
+
+FIRST_NAMES = ["Alice", "Bob", "Chloé", "David", "Élodie", "François", "Gaëlle",
+               "Hugo", "Inès", "Jules", "Karim", "Léa", "Mathis", "Nina",
+               "Oscar", "Paul", "Quentin", "Rose", "Sami", "Théo"]
+LAST_NAMES = ["Martin", "Dupont", "Smith", "O'Neil", "Nguyen", "de la Tour"]
+
+WORDS = {
+    "french": ["salut", "ça", "va", "ce", "soir", "demain", "on", "se", "voit",
+               "au", "restaurant", "je", "suis", "en", "retard", "trop", "bien",
+               "merci", "photo", "vacances", "plage", "match", "film", "chat",
+               "travail", "week-end", "quelle", "heure", "qui", "vient",
+               "apéro", "gâteau", "anniversaire", "c'est", "génial", "oui",
+               "non", "peut-être", "d'accord", "1", "2", "20h"],
+    "english": ["hi", "how", "are", "you", "tonight", "tomorrow", "we", "meet",
+                "at", "the", "restaurant", "I'm", "late", "so", "good",
+                "thanks", "photo", "holidays", "beach", "game", "movie", "cat",
+                "work", "weekend", "what", "time", "who", "is", "coming",
+                "drinks", "cake", "birthday", "it's", "great", "yes", "no",
+                "maybe", "ok", "1", "2", "8pm"],
+}
+
+# Single code points, skin tones, ZWJ sequences and flags
+EMOJIS = ["😀", "😂", "🥲", "❤️", "👍", "👍🏽", "🙏🏿", "🎉", "🔥", "😭",
+          "👨‍👩‍👧", "🏳️‍🌈", "🇫🇷", "🇺🇸", "☕", "🍕"]
+
+SYSTEM_MESSAGES = {
+    "french": "{} a ajouté {}",
+    "english": "{} added {}",
+}
+
+
+def iter_conversation(n_messages, fmt="fr", n_authors=5, multiline_rate=0.05,
+                      emoji_rate=0.2, media_rate=0.1, question_rate=0.15,
+                      days=365, start=datetime(2020, 1, 1), seed=0):
+    """
+    Lines of a synthetic conversation export, generated lazily
+
+    Parameters
+    ----------
+    n_messages: int
+        Number of messages in the conversation
+    fmt: str
+        Name of the export format in config/formats.yaml (e.g. "fr", "us")
+    n_authors: int
+        Number of participants
+    multiline_rate: float
+        Share of messages written on several lines
+    emoji_rate: float
+        Share of messages with one or more emoji
+    media_rate: float
+        Share of omitted media placeholders
+    question_rate: float
+        Share of messages ending with a question mark
+    days: int
+        Number of days between the first and the last message
+    start: datetime
+        Date of the first message
+    seed: int
+        Seed of the random generator, same seed gives the same conversation
+
+    Returns
+    -------
+    lines: iterator of str
+        Lines of the export, with their final new line
+    """
+    rng = random.Random(seed)
+    fmt = load_formats()[fmt]
+    words = WORDS.get(fmt["language"], WORDS["english"])
+    system_message = SYSTEM_MESSAGES.get(fmt["language"],
+                                         SYSTEM_MESSAGES["english"])
+
+    # Unique names, some with spaces, accents or apostrophes
+    authors = []
+    for i in range(n_authors):
+        name = FIRST_NAMES[i % len(FIRST_NAMES)]
+        if i >= len(FIRST_NAMES) or rng.random() < 0.3:
+            name += " " + rng.choice(LAST_NAMES)
+        if i >= len(FIRST_NAMES):
+            name += f" {i}"
+        authors.append(name)
+
+    # Few talkative participants and many quiet ones
+    weights = [1 / (rank + 1) for rank in range(n_authors)]
+    mean_gap = days * 24 * 60 / max(n_messages, 1)
+    date = start
+
+    for _ in range(n_messages):
+        date += timedelta(minutes=round(rng.expovariate(1 / mean_gap)))
+        header = f"{date.strftime(fmt['date_format'])} - "
+
+        # Events without author are not messages but appear in exports
+        if rng.random() < 0.001:
+            yield header + system_message.format(*rng.sample(authors, 2)) + "\n"
+            continue
+
+        author = rng.choices(authors, weights)[0]
+        if rng.random() < media_rate:
+            yield f"{header}{author}: {fmt['media_message']}\n"
+            continue
+
+        n_lines = rng.randint(2, 4) if rng.random() < multiline_rate else 1
+        lines = []
+        for _ in range(n_lines):
+            line = " ".join(rng.choices(words, k=rng.randint(1, 12)))
+            if rng.random() < emoji_rate:
+                line += " " + "".join(rng.choices(EMOJIS, k=rng.randint(1, 3)))
+            lines.append(line)
+        if rng.random() < question_rate:
+            lines[-1] += " ?"
+        yield f"{header}{author}: " + "\n".join(lines) + "\n"
+
+
+def generate_conversation(n_messages, **kwargs):
+    """
+    Synthetic conversation export as a string
+
+    Parameters
+    ----------
+    n_messages: int
+        Number of messages in the conversation
+    **kwargs:
+        Options of iter_conversation (format, number of authors, rates, ...)
+
+    Returns
+    -------
+    text: str
+        Content of the export file
+    """
+    return "".join(iter_conversation(n_messages, **kwargs))
+
+
+def write_conversation(path, n_messages, **kwargs):
+    """
+    Write a synthetic conversation export, without holding it in memory
+
+    Parameters
+    ----------
+    path: str
+        Path of the export file to write
+    n_messages: int
+        Number of messages in the conversation
+    **kwargs:
+        Options of iter_conversation (format, number of authors, rates, ...)
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        f.writelines(iter_conversation(n_messages, **kwargs))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Generate a synthetic WhatsApp group export")
+    parser.add_argument("path", help="Path of the export file to write")
+    parser.add_argument("-n", "--messages", type=int, default=10000)
+    parser.add_argument("--format", default="fr",
+                        help="Format name in config/formats.yaml")
+    parser.add_argument("--authors", type=int, default=5)
+    parser.add_argument("--multiline-rate", type=float, default=0.05)
+    parser.add_argument("--emoji-rate", type=float, default=0.2)
+    parser.add_argument("--media-rate", type=float, default=0.1)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    write_conversation(args.path, args.messages, fmt=args.format,
+                       n_authors=args.authors,
+                       multiline_rate=args.multiline_rate,
+                       emoji_rate=args.emoji_rate, media_rate=args.media_rate,
+                       days=args.days, seed=args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""
+Benchmark of the parser, the analytics and the plots on synthetic exports
+
+Each function is timed (best of a few runs) and, in a separate run, its peak
+memory is measured with tracemalloc. Results are printed and saved in JSON.
+
+Usage : python -m benchmarks.run --scales 10000 100000 --output results.json
+"""
+import argparse
+import json
+import mmap
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import matplotlib
+import pandas as pd
+
+from src import data as analytics
+from src.formats import load_formats
+from src.preprocessing import get_data_from_buffer, get_data_from_txt
+
+from .generator import write_conversation
+
+matplotlib.use("Agg")
+
+SCALES = [10_000, 100_000, 1_000_000, 5_000_000]
+STAGES = ["parse", "data", "viz"]
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+
+
+def get_conversation_path(n_messages, fmt, seed, data_dir=DATA_DIR):
+    """Path of a synthetic export, generated only if it does not exist yet"""
+    os.makedirs(data_dir, exist_ok=True)
+    _path = os.path.join(data_dir, f"{fmt}-{n_messages}-{seed}.txt")
+    if not os.path.exists(_path):
+        write_conversation(_path + ".tmp", n_messages, fmt=fmt, seed=seed)
+        os.replace(_path + ".tmp", _path)
+    return _path
+
+
+def parse_txt(path, fmt):
+    with open(path, encoding="utf-8") as f:
+        return get_data_from_txt(f, fmt["header"], fmt["date_format"],
+                                 fmt["media_message"])
+
+
+def parse_buffer(path, fmt):
+    with open(path, "rb") as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        return get_data_from_buffer(buffer, fmt["header"], fmt["date_format"],
+                                    fmt["media_message"])
+
+
+def get_parse_cases(path, fmt):
+    return {"get_data_from_txt": lambda: parse_txt(path, fmt),
+            "get_data_from_buffer": lambda: parse_buffer(path, fmt)}
+
+
+def get_data_cases(data, fmt, engine="pandas"):
+    media_message, language = fmt["media_message"], fmt["language"]
+    return {
+        "get_author_stats": lambda: analytics.get_author_stats(data, engine),
+        "get_basic_infos": lambda: analytics.get_basic_infos(data, media_message, engine),
+        "get_date_range": lambda: analytics.get_date_range(data, engine),
+        "get_questions_by_name": lambda: analytics.get_questions_by_name(data, engine),
+        "get_number_of_message": lambda: analytics.get_number_of_message(data, engine),
+        "get_maximal_silence_period": lambda: analytics.get_maximal_silence_period(data, engine),
+        "get_mean_message_len": lambda: analytics.get_mean_message_len(data, engine),
+        "percentage_msg_with_emoji": lambda: analytics.percentage_msg_with_emoji(data, engine),
+        "get_emoji_counter": lambda: analytics.get_emoji_counter(data, engine),
+        "get_daily_activity": lambda: analytics.get_daily_activity(data, 7, engine),
+        "get_nb_message_per_day": lambda: analytics.get_nb_message_per_day(data, engine),
+        "get_moving_average_nb_message": lambda: analytics.get_moving_average_nb_message(data, engine=engine),
+        "get_hourly_data": lambda: analytics.get_hourly_data(data, engine),
+        "get_daily_data": lambda: analytics.get_daily_data(data, engine),
+        "get_monthly_data": lambda: analytics.get_monthly_data(data, engine),
+        "get_media_interval_stats": lambda: analytics.get_media_interval_stats(data, media_message, engine=engine),
+        "get_mean_media_interval": lambda: analytics.get_mean_media_interval(data, media_message, engine=engine),
+        "get_word_frequencies": lambda: analytics.get_word_frequencies(data, language, engine=engine),
+        "detect_language": lambda: analytics.detect_language(data),
+    }
+
+
+def get_viz_cases(data, fmt):
+    from src import viz
+
+    moving_average = analytics.get_moving_average_nb_message(data)
+    return {
+        "plot_messages_per_day": lambda: viz.plot_messages_per_day(data, show=False),
+        "plot_moving_nb_messages": lambda: viz.plot_moving_nb_messages(moving_average, show=False),
+        "plot_moving_nb_messages_individuals": lambda: viz.plot_moving_nb_messages_individuals(data, show=False),
+        "plot_emoji_data": lambda: viz.plot_emoji_data(data, show=False),
+        "plot_hourly_data": lambda: viz.plot_hourly_data(data, show=False),
+        "plot_daily_data": lambda: viz.plot_daily_data(data, show=False),
+        "plot_monthly_data": lambda: viz.plot_monthly_data(data, show=False),
+        "plot_percentage_msg_emoji": lambda: viz.plot_percentage_msg_emoji(data, show=False),
+        "plot_wordcloud": lambda: viz.plot_wordcloud(data, language=fmt["language"], show=False),
+    }
+
+
+def reset_caches():
+    """Forget the results memoized between calls, each case is measured cold"""
+    import matplotlib.pyplot as plt
+
+    analytics._STATS_CACHE.clear()
+    polars_engine = sys.modules.get("src.polars_engine")
+    if polars_engine is not None:
+        polars_engine._FRAME_CACHE.clear()
+        polars_engine._STATS_CACHE.clear()
+    viz = sys.modules.get("src.viz")
+    if viz is not None:
+        viz._WORDCLOUD_CACHE.clear()
+    plt.close("all")
+
+
+def measure(func, repeat=3, memory=True):
+    """
+    Time and peak memory of a function
+
+    Parameters
+    ----------
+    func: callable
+        Function without argument to measure
+    repeat: int
+        Number of timed runs, the best one is kept
+    memory: bool
+        Measure the peak memory in an additional traced run
+
+    Returns
+    -------
+    result: dict
+        Best time in seconds, peak and retained memory in bytes
+    """
+    times = []
+    for _ in range(repeat):
+        reset_caches()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    result = {"time": min(times)}
+
+    if memory:
+        reset_caches()
+        tracemalloc.start()
+        output = func()
+        retained, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del output
+        result["peak_memory"] = peak
+        result["retained_memory"] = retained
+    return result
+
+
+def run(scales=SCALES, stages=STAGES, fmt="fr", seed=0, repeat=3, memory=True,
+        data_dir=DATA_DIR, engine="pandas"):
+    """
+    Benchmark every stage at each scale
+
+    Parameters
+    ----------
+    scales: list of int
+        Numbers of messages of the synthetic conversations
+    stages: list of str
+        Stages to measure among "parse", "data" and "viz"
+    fmt: str
+        Name of the export format in config/formats.yaml
+    seed: int
+        Seed of the synthetic conversations
+    repeat: int
+        Number of timed runs for each function
+    memory: bool
+        Measure the peak memory of each function
+    data_dir: str
+        Directory where the synthetic conversations are kept
+    engine: str
+        Engine computing the analytics, one of src.data.ENGINES
+
+    Returns
+    -------
+    results: list of dict
+        One result per function and scale
+    """
+    fmt_name, fmt = fmt, load_formats()[fmt]
+    results = []
+
+    for n_messages in scales:
+        path = get_conversation_path(n_messages, fmt_name, seed, data_dir)
+        data = parse_buffer(path, fmt)
+        cases = {}
+        if "parse" in stages:
+            cases.update({("parse", name): func for name, func
+                          in get_parse_cases(path, fmt).items()})
+        if "data" in stages:
+            cases.update({("data", name): func for name, func
+                          in get_data_cases(data, fmt, engine).items()})
+        if "viz" in stages:
+            cases.update({("viz", name): func for name, func
+                          in get_viz_cases(data, fmt).items()})
+
+        for (stage, name), func in cases.items():
+            result = {"stage": stage, "function": name, "n_messages": n_messages,
+                      "file_size": os.path.getsize(path)}
+            result.update(measure(func, repeat, memory))
+            results.append(result)
+            print(format_result(result), flush=True)
+    return results
+
+
+def format_result(result):
+    line = (f"{result['n_messages']:>9} {result['stage']:<6}"
+            f"{result['function']:<38}{result['time']:>10.3f} s")
+    if "peak_memory" in result:
+        line += f"{result['peak_memory'] / 1024 ** 2:>10.1f} MB peak"
+    return line
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the parser, the analytics and the plots")
+    parser.add_argument("--scales", type=int, nargs="+", default=SCALES,
+                        help="Numbers of messages of the conversations")
+    parser.add_argument("--stages", nargs="+", default=STAGES, choices=STAGES)
+    parser.add_argument("--format", default="fr",
+                        help="Format name in config/formats.yaml")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-memory", action="store_true",
+                        help="Do not measure the peak memory (faster)")
+    parser.add_argument("--data-dir", default=DATA_DIR,
+                        help="Directory where the conversations are generated")
+    parser.add_argument("--engine", default="pandas", choices=analytics.ENGINES,
+                        help="Engine computing the analytics")
+    parser.add_argument("-o", "--output", default=None,
+                        help="JSON file where the results are saved")
+    args = parser.parse_args(argv)
+
+    results = run(args.scales, args.stages, args.format, args.seed,
+                  args.repeat, not args.no_memory, args.data_dir, args.engine)
+
+    if args.output is not None:
+        report = {"python": platform.python_version(),
+                  "pandas": pd.__version__,
+                  "machine": platform.machine(),
+                  "cpus": os.cpu_count(),
+                  "format": args.format,
+                  "engine": args.engine,
+                  "seed": args.seed,
+                  "results": results}
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
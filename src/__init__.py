@@ -1,4 +1,27 @@
+import importlib
+
+from .cache import *
 from .data import *
+from .database import *
+from .formats import *
 from .preprocessing import *
+from .profiling import *
 from .utils import *
-from .viz import *
+
+# Public names of src.viz, imported on first use (heavy dependencies)
+VIZ_NAMES = frozenset([
+    "get_image_uri", "get_image_mask", "render_wordcloud",
+    "plot_messages_per_day", "plot_moving_nb_messages",
+    "plot_moving_nb_messages_individuals", "plot_emoji_data",
+    "plot_hourly_data", "plot_daily_data", "plot_monthly_data",
+    "plot_percentage_msg_emoji", "plot_wordcloud",
+])
+
+
+def __getattr__(name):
+    """The src.viz module and its plotting functions, imported on first use"""
+    if name == "viz":
+        return importlib.import_module(".viz", __name__)
+    if name in VIZ_NAMES:
+        return getattr(importlib.import_module(".viz", __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
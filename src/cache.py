@@ -0,0 +1,132 @@
+import hashlib
+import os
+
+import pandas as pd
+
+CACHE_MAX_SIZE = 1024 ** 3  # 1 GB
+CHUNK_SIZE = 1024 ** 2
+
+
+def get_cache_key(path, header, date_format, version):
+    """
+    Content-addressed key of a parsed conversation
+
+    Parameters
+    ----------
+    path: str
+        Path of the conversation file
+    header: str
+        Regex of the date format + the sign separator between date and name
+    date_format: str
+        Datetime format of the conversation's date
+    version: int
+        Version of the parser producing the dataframe
+
+    Returns
+    -------
+    key: str
+        Parser version and hash of the file content and of its format
+    """
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            sha.update(chunk)
+    sha.update(header.encode("utf-8"))
+    sha.update(date_format.encode("utf-8"))
+    return f"v{version}-{sha.hexdigest()}"
+
+
+def load_cached(cache_dir, key):
+    """
+    Load a parsed conversation from the cache
+
+    Parameters
+    ----------
+    cache_dir: str
+        Directory of the cache
+    key: str
+        Key of the conversation, as returned by get_cache_key
+
+    Returns
+    -------
+    data: pd.DataFrame or None
+        Cached dataframe, None if the key is not in the cache
+    """
+    _path = os.path.join(cache_dir, key + ".parquet")
+
+    # Mark as recently used, the entry may be evicted by another process
+    # at any time : a missing file is a cache miss
+    try:
+        os.utime(_path)
+        return pd.read_parquet(_path)
+    except FileNotFoundError:
+        return None
+
+
+def save_cached(cache_dir, key, data, max_size=CACHE_MAX_SIZE):
+    """
+    Store a parsed conversation in the cache, then evict old entries
+
+    Parameters
+    ----------
+    cache_dir: str
+        Directory of the cache
+    key: str
+        Key of the conversation, as returned by get_cache_key
+    data: pd.DataFrame
+        Pre-processed conversation dataframe
+    max_size: int
+        Maximal size of the cache in bytes
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    _path = os.path.join(cache_dir, key + ".parquet")
+    # Unique temporary file, several processes may write the same entry
+    tmp_path = f"{_path}.{os.getpid()}.tmp"
+    data.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, _path)
+    evict(cache_dir, max_size, version=key.split("-", 1)[0])
+
+
+def evict(cache_dir, max_size, version=None):
+    """
+    Remove the least recently used entries until the cache fits in its size
+
+    Parameters
+    ----------
+    cache_dir: str
+        Directory of the cache
+    max_size: int
+        Maximal size of the cache in bytes
+    version: str
+        Current parser version prefix, entries from other versions are removed
+    """
+    entries = []
+
+    # Entries removed meanwhile by another process are skipped
+    for name in os.listdir(cache_dir):
+        if not name.endswith(".parquet"):
+            continue
+        _path = os.path.join(cache_dir, name)
+        if version is not None and not name.startswith(version + "-"):
+            remove_entry(_path)
+            continue
+        try:
+            stat = os.stat(_path)
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, _path))
+
+    total_size = sum(size for _, size, _ in entries)
+    for _, size, _path in sorted(entries):
+        if total_size <= max_size:
+            break
+        remove_entry(_path)
+        total_size -= size
+
+
+def remove_entry(path):
+    """Remove a cache entry, unless another process already removed it"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -1,11 +1,316 @@
-from datetime import datetime, timedelta
+import os
+import re
+import weakref
+from collections import Counter
+from datetime import timedelta
+from functools import cached_property, lru_cache
+from itertools import chain
 
 import numpy as np
 import pandas as pd
-from emoji import emoji_count
+import pyarrow as pa
+import pyarrow.compute as pc
+from emoji import EMOJI_DATA
 
+from .profiling import timed
 
-def get_basic_infos(data, media_message):
+_STATS_CACHE = {}
+
+# Stop words shipped with the application, one file per language
+STOPWORDS_DIR = os.path.join(os.path.dirname(__file__), os.pardir,
+                             "config", "stopwords")
+
+# Tokens kept in word counts (same as the default of WordCloud)
+WORD_PATTERN = re.compile(r"\w[\w']*")
+
+# The only emoji starting with an ASCII character : keycaps, e.g. 1️⃣
+KEYCAP_PATTERN = "[#*0-9]\ufe0f?\u20e3"
+
+# Engines running the analytics, all but pandas are optional dependencies
+ENGINES = ["pandas", "polars"]
+
+
+@lru_cache(maxsize=None)
+def get_emoji_engine():
+    """
+    Build the emoji search structures from the emoji database, once
+
+    Returns
+    -------
+    tree: dict
+        Prefix tree of every emoji sequence (ZWJ, skin tones, flags, ...),
+        the key "" marks the end of a complete emoji
+    start_pattern: re.Pattern
+        Character class of the first characters of all the emoji outside
+        ASCII, or a whole keycap : digits alone are not candidates
+    """
+    tree = {}
+    for sequence in EMOJI_DATA:
+        node = tree
+        for char in sequence:
+            node = node.setdefault(char, {})
+        node[""] = True
+
+    # Ranges keep the class fast, most emoji are outside the 16 bits range
+    codes = sorted(ord(char) for char in tree if ord(char) >= 128)
+    ranges = []
+    for code in codes:
+        if ranges and ranges[-1][1] == code - 1:
+            ranges[-1][1] = code
+        else:
+            ranges.append([code, code])
+    start_pattern = re.compile("[%s]|%s" % ("".join(
+        re.escape(chr(lo)) if lo == hi else
+        "%s-%s" % (re.escape(chr(lo)), re.escape(chr(hi)))
+        for lo, hi in ranges), KEYCAP_PATTERN))
+    return tree, start_pattern
+
+
+def find_emojis(message):
+    """
+    List the emoji of a message, multi-codepoint sequences being kept whole
+
+    Parameters
+    ----------
+    message: str
+        A single message
+
+    Returns
+    -------
+    emojis: list
+        Emoji of the message in order of appearance
+    """
+    tree, start_pattern = get_emoji_engine()
+    emojis = []
+    pos = 0
+
+    while True:
+        match = start_pattern.search(message, pos)
+        if match is None:
+            return emojis
+
+        # Longest complete emoji starting here
+        start = match.start()
+        node, end = tree, None
+        for i in range(start, len(message)):
+            node = node.get(message[i])
+            if node is None:
+                break
+            if "" in node:
+                end = i + 1
+
+        if end is None:
+            pos = start + 1
+        else:
+            emojis.append(message[start:end])
+            pos = end
+
+
+def memoize(cache, data, func):
+    """
+    Result of func(data), memoized in cache for the lifetime of the
+    dataframe (which is not supposed to be modified in place)
+
+    Parameters
+    ----------
+    cache: dict
+        Results of func, by id of the dataframe
+    data: pd.DataFrame
+        Pre-processed conversation dataframe
+    func: callable
+        Function of the dataframe
+
+    Returns
+    -------
+    result: object
+        Result of func(data)
+    """
+    key = id(data)
+    cached = cache.get(key)
+    if cached is not None and cached[0]() is data:
+        return cached[1]
+
+    result = func(data)
+    cache[key] = (weakref.ref(data), result)
+    weakref.finalize(data, cache.pop, key, None)
+    return result
+
+
+class ConversationStats:
+    """
+    Per-author statistics of a conversation, computed in a single pass
+
+    The features of each message (length, question, emoji, time since the
+    previous message of the same author) are computed once at creation, then
+    all the per-author metrics are aggregated in one groupby.
+
+    Parameters
+    ----------
+    data: pd.DataFrame
+        Pre-processed conversation dataframe
+    """
+
+    def __init__(self, data):
+        message = data["message"]
+        length = message.str.len()
+        has_question = message.str.contains("?", regex=False)
+        gap = data.groupby("author", observed=True)["date"].diff()
+
+        # Emoji are only searched in messages with a candidate character
+        _, start_pattern = get_emoji_engine()
+        candidates = message.str.contains(start_pattern.pattern)
+        self._emoji_rows = np.flatnonzero(candidates.to_numpy(dtype=bool))
+        self._emojis = [find_emojis(msg)
+                        for msg in message.iloc[self._emoji_rows]]
+        self._emoji_authors = data["author"].iloc[self._emoji_rows]
+        has_emoji = np.zeros(len(data), dtype=bool)
+        has_emoji[self._emoji_rows] = [len(emojis) != 0
+                                       for emojis in self._emojis]
+
+        self.features = pd.DataFrame({
+            "author": data["author"],
+            "length": length.to_numpy(dtype=np.int64),
+            "has_question": has_question.to_numpy(dtype=bool),
+            "has_emoji": has_emoji,
+            "gap": gap.fillna(pd.Timedelta(seconds=0)),
+        }, index=data.index)
+
+    @cached_property
+    def by_author(self):
+        """
+        All the statistics for each participant
+
+        Returns
+        -------
+        res: pd.DataFrame
+            Author as index in order of appearance, one column per metric:
+            n_messages, n_questions, mean_length, emoji_rate and max_silence
+        """
+        res = self.features.groupby("author", observed=True, sort=False).agg(
+            n_messages=("length", "count"),
+            n_questions=("has_question", "sum"),
+            mean_length=("length", "mean"),
+            emoji_rate=("has_emoji", "mean"),
+            max_silence=("gap", "max"),
+        )
+        return res
+
+    @cached_property
+    def emoji_counts(self):
+        """
+        Number of utilisation of each emoji by each participant
+
+        Returns
+        -------
+        res: pd.DataFrame
+            Three columns count, author and emoji, sorted by count
+        """
+        n_emojis = [len(emojis) for emojis in self._emojis]
+        res = pd.DataFrame({
+            "author": np.repeat(self._emoji_authors.to_numpy(dtype=object),
+                                n_emojis),
+            "emoji": list(chain.from_iterable(self._emojis)),
+        })
+        res = res.value_counts().reset_index(name="count")
+        return res[["count", "author", "emoji"]]
+
+
+@timed
+def get_conversation_stats(data):
+    """
+    Statistics of a conversation, memoized for the lifetime of the dataframe
+
+    The dataframe is not supposed to be modified in place afterwards.
+
+    Parameters
+    ----------
+    data: pd.DataFrame
+        Pre-processed conversation dataframe
+
+    Returns
+    -------
+    stats: ConversationStats
+        Per-author statistics of the conversation
+    """
+    return memoize(_STATS_CACHE, data, ConversationStats)
+
+
+def check_engine(engine):
+    """Raise a ValueError if the engine is not one of ENGINES"""
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine: {engine}")
+
+
+def get_engine(engine):
+    """
+    Module running the analytics with another engine than pandas
+
+    The per-participant statistics, the basic infos, the date range, the
+    daily activity, the temporal histograms and the media intervals run on
+    the engine. Words and emoji are counted in Python whatever the engine.
+
+    Parameters
+    ----------
+    engine: str
+        One of ENGINES except "pandas"
+
+    Returns
+    -------
+    module: module
+        Functions with the same name and results as those of this module
+    """
+    if engine == "polars":
+        from . import polars_engine
+        return polars_engine
+    raise ValueError(f"Unknown engine: {engine}")
+
+
+@timed
+def get_author_stats(data, engine="pandas"):
+    """
+    All the statistics for each participant
+
+    Parameters
+    ----------
+    data: pd.DataFrame
+        Pre-processed conversation dataframe
+    engine: str
+        Engine computing the statistics, one of ENGINES
+
+    Returns
+    -------
+    res: pd.DataFrame
+        Author as index in order of appearance, one column per metric:
+        n_messages, n_questions, mean_length, emoji_rate and max_silence
+    """
+    if engine != "pandas":
+        return get_engine(engine).get_author_stats(data)
+    return get_conversation_stats(data).by_author
+
+
+def get_media_mask(data, media_message):
+    """
+    Messages which are omitted medias
+
+    Parameters
+    ----------
+    data: pd.DataFrame
+        Pre-processed conversation dataframe
+    media_message: str
+        Message value when a media is omitted (language dependant)
+
+    Returns
+    -------
+    mask: pd.Series
+        True for media messages, read from the is_media column if present
+    """
+    if "is_media" in data:
+        return data["is_media"]
+    return data["message"] == media_message
+
+
+@timed
+def get_basic_infos(data, media_message, engine="pandas"):
     """
     Basic infos of the conversation dataframe
 
@@ -15,22 +320,28 @@ def get_basic_infos(data, media_message):
         Pre-processed conversation dataframe
     media_message: str
         Message value when a media is omitted (language dependant)
+    engine: str
+        Engine computing the statistics, one of ENGINES
 
     Returns
     -------
     result: dict
         Basic statistics of the conversation
     """
+    if engine != "pandas":
+        return get_engine(engine).get_basic_infos(data, media_message)
+
     result = {}
     result["start_date"] = data["date"].min()
     result["end_date"] = data["date"].max()
     result["n_messages"] = len(data)
     result["n_authors"] = data["author"].nunique()
-    result["n_medias"] = len(data[data["message"] == media_message])
+    result["n_medias"] = int(get_media_mask(data, media_message).sum())
     return result
 
 
-def get_date_range(data):
+@timed
+def get_date_range(data, engine="pandas"):
     """
     Start date and end date of the conversation
 
@@ -38,18 +349,48 @@ def get_date_range(data):
     ----------
     data: pd.DataFrame
         Pre-processed conversation dataframe
+    engine: str
+        Engine computing the statistics, one of ENGINES
 
     Returns
     -------
     _min, _max: str
         Start/end date
     """
+    if engine != "pandas":
+        return get_engine(engine).get_date_range(data)
+
     _min = data["date"].min().strftime('%d/%m/%Y')
     _max = data["date"].max().strftime('%d/%m/%Y')
     return _min, _max
 
 
-def get_questions_by_name(data):
+def sort_by_value(values, by_name=True):
+    """
+    Value of each participant, the largest first
+
+    Parameters
+    ----------
+    values: pd.Series
+        Name as index
+    by_name: bool
+        Participants with the same value in alphabetical order if True,
+        else in the order of values
+
+    Returns
+    -------
+    res: dict
+        Name as key, value as value
+    """
+    res = values.to_dict().items()
+    if by_name:
+        res = sorted(res)
+    return {k: v for k, v in sorted(res, key=lambda item: item[1],
+                                    reverse=True)}
+
+
+@timed
+def get_questions_by_name(data, engine="pandas"):
     """
     Number of questions for each participant in the conversation
 
@@ -57,24 +398,20 @@ def get_questions_by_name(data):
     ----------
     data: pd.DataFrame
         Pre-processed conversation dataframe
+    engine: str
+        Engine computing the statistics, one of ENGINES
 
     Returns
     -------
     n_questions: dict
         Name as key and number of questions as value
     """
-    n_questions = {author: 0 for author in data["author"].unique()}
-
-    for _, row in data.iterrows():
-        is_question = ("?" in row["message"]) * 1
-        n_questions[row["author"]] += is_question
+    n_questions = get_author_stats(data, engine)["n_questions"]
+    return sort_by_value(n_questions, by_name=False)
 
-    n_questions = {k: v for k, v in sorted(
-        n_questions.items(), key=lambda item: item[1], reverse=True)}
-    return n_questions
 
-
-def get_number_of_message(data):
+@timed
+def get_number_of_message(data, engine="pandas"):
     """
     Total number of messages for each participant in the conversation
 
@@ -82,19 +419,19 @@ def get_number_of_message(data):
     ----------
     data: pd.DataFrame
         Pre-processed conversation dataframe
+    engine: str
+        Engine computing the statistics, one of ENGINES
 
     Returns
     -------
     res: dict
         Name as key and number of messages as value
     """
-    res = data.groupby("author").agg("count")["message"].to_dict()
-    res = {k: v for k, v in sorted(
-        res.items(), key=lambda item: item[1], reverse=True)}
-    return res
+    return sort_by_value(get_author_stats(data, engine)["n_messages"])
 
 
-def get_maximal_silence_period(data):
+@timed
+def get_maximal_silence_period(data, engine="pandas"):
     """
     Maximal number of days without sending a message for each participant
 
@@ -102,21 +439,20 @@ def get_maximal_silence_period(data):
     ----------
     data: pd.DataFrame
         Pre-processed conversation dataframe
+    engine: str
+        Engine computing the statistics, one of ENGINES
 
     Returns
     -------
     res: dict
         Name as key, period of silence as value
     """
-    def get_max(x): return max(
-        (x['date']-x['date'].shift()).fillna(pd.Timedelta(seconds=0)))
-    res = data.groupby("author").apply(get_max).to_dict()
-    res = {k: str(v) for k, v in sorted(
-        res.items(), key=lambda item: item[1], reverse=True)}
-    return res
+    res = sort_by_value(get_author_stats(data, engine)["max_silence"])
+    return {k: str(v) for k, v in res.items()}
 
 
-def get_mean_message_len(data):
+@timed
+def get_mean_message_len(data, engine="pandas"):
     """
     Mean of the messages size for each participant in the conversation
 
@@ -124,20 +460,19 @@ def get_mean_message_len(data):
     ----------
     data: pd.DataFrame
         Pre-processed conversation dataframe
+    engine: str
+        Engine computing the statistics, one of ENGINES
 
     Returns
     -------
     res: dict
         Name as key, average message length as value
     """
-    res = data.groupby("author").apply(lambda x: np.mean(
-        [len(msg) for msg in x["message"]])).to_dict()
-    res = {k: v for k, v in sorted(
-        res.items(), key=lambda item: item[1], reverse=True)}
-    return res
+    return sort_by_value(get_author_stats(data, engine)["mean_length"])
 
 
-def percentage_msg_with_emoji(data):
+@timed
+def percentage_msg_with_emoji(data, engine="pandas"):
     """
    Percentage of messages with one or more emoji for each participant in the conversation
 
@@ -145,20 +480,89 @@ def percentage_msg_with_emoji(data):
     ----------
     data: pd.DataFrame
         Pre-processed conversation dataframe
+    engine: str
+        Engine computing the statistics, one of ENGINES
 
     Returns
     -------
     res: dict
         Name as key, proportion of message with emoji as value
     """
-    res = data.groupby("author").apply(lambda x: np.mean(
-        [emoji_count(msg) != 0 for msg in x["message"]])).to_dict()
-    res = {k: v for k, v in sorted(
-        res.items(), key=lambda item: item[1], reverse=True)}
+    return sort_by_value(get_author_stats(data, engine)["emoji_rate"])
+
+
+def build_daily_activity(days, authors, window=1, weights=None):
+    """
+    Number of messages of each participant for every day, summed over a
+    rolling window of days
+
+    Parameters
+    ----------
+    days: pd.Series
+        Day (date at midnight) of each message, or of each count of messages
+    authors: array-like
+        Author of each message (or count)
+    window: int
+        Number of days summed for each day, 1 for no rolling
+    weights: array-like
+        Number of messages of each count, one message each if None
+
+    Returns
+    -------
+    res: pd.DataFrame
+        Every day between the first and the last message as index,
+        authors as columns
+    """
+    first_day = days.min()
+    day_codes = ((days - first_day) // pd.Timedelta(days=1)).to_numpy()
+    author_codes, names = pd.factorize(authors, sort=True)
+
+    # Dense day x author count matrix, days without message included
+    n_days = day_codes.max() + 1 if len(days) else 0
+    counts = np.bincount(day_codes * len(names) + author_codes,
+                         weights=weights, minlength=n_days * len(names))
+    counts = counts.astype(np.int64).reshape(n_days, len(names))
+
+    res = pd.DataFrame(counts,
+                       index=pd.date_range(first_day, periods=n_days,
+                                           freq="D", name="day"),
+                       columns=pd.Index(np.asarray(names, dtype=object),
+                                        name="author"))
+    if window > 1:
+        res = res.rolling(window, min_periods=1).sum()
     return res
 
 
-def get_nb_message_per_day(data):
+@timed
+def get_daily_activity(data, window=1, engine="pandas"):
+    """
+    For each day and each participant, compute the number of message,
+    summed over a rolling window of days
+
+    Parameters
+    ----------
+    data: pd.DataFrame
+        Pre-processed conversation dataframe
+    window: int
+        Number of days summed for each day, 1 for no rolling
+    engine: str
+        Engine computing the statistics, one of ENGINES
+
+    Returns
+    -------
+    res: pd.DataFrame
+        Every day between the first and the last message as index,
+        authors as columns
+    """
+    if engine != "pandas":
+        return get_engine(engine).get_daily_activity(data, window)
+
+    return build_daily_activity(data["date"].dt.normalize(), data["author"],
+                                window)
+
+
+@timed
+def get_nb_message_per_day(data, engine="pandas"):
     """
     Number of messages for each day
 
@@ -166,55 +570,212 @@ def get_nb_message_per_day(data):
     ----------
     data: pd.DataFrame
         Pre-processed conversation dataframe
+    engine: str
+        Engine computing the statistics, one of ENGINES
 
     Returns
     -------
     tmp: pd.DataFrame
         Count the number of message for each day in the conversation
     """
-    days = pd.DataFrame([datetime.strptime(x, '%d/%m/%Y') for x in data["date"].dt.strftime('%d/%m/%Y')],
-                        columns=["day"])
-
-    tmp = pd.concat((data["date"], days), axis=1)
-    tmp = tmp.groupby("day").agg("count").reset_index()
+    tmp = get_daily_activity(data, engine=engine).sum(axis=1)
+    tmp = tmp[tmp > 0].rename("date").reset_index()
     return tmp
 
 
-def get_moving_average_nb_message(data):
+@timed
+def get_moving_average_nb_message(data, window=7, engine="pandas"):
     """
-    Moving number of message for a period of 7 days
+    Moving number of message for a period of some days
 
     Parameters
     ----------
     data: pd.DataFrame
         Pre-processed conversation dataframe
+    window: int
+        Number of days of the period
+    engine: str
+        Engine computing the statistics, one of ENGINES
 
     Returns
     -------
     tmp: pd.DataFrame
         Number of messages for a period of one week by rolling the date range
     """
-    tmp = get_nb_message_per_day(data)
+    tmp = get_daily_activity(data, window, engine).sum(axis=1)
+    tmp = tmp.rename("date").reset_index()
+    return tmp
 
-    # Add day not present in database
-    _tmp = []
 
-    for day in pd.date_range(tmp["day"].min(), tmp["day"].max(), freq='D'):
-        if day not in tmp["day"]:
-            to_append = pd.DataFrame([[day, 0]],
-                                     columns=["day", "date"])
-            _tmp.append(to_append)
+def has_nltk_resource(resource):
+    """
+    Check if an NLTK resource is installed, without downloading it
 
-    tmp = pd.concat((tmp, pd.concat(_tmp)), axis=0)
+    Parameters
+    ----------
+    resource: str
+        Path of the resource in the NLTK data, e.g. "corpora/stopwords"
 
-    # Sum of number of messages during 7 days (rolling)
-    tmp = tmp.set_index('day').sort_index().rolling("7D").sum()
-    tmp = tmp.reset_index()
+    Returns
+    -------
+    found: bool
+        True if the resource can be loaded locally
+    """
+    import nltk
 
-    return tmp
+    try:
+        nltk.data.find(resource)
+    except LookupError:
+        return False
+    return True
+
+
+@lru_cache(maxsize=None)
+def get_stopwords(language):
+    """
+    Stop words of a language as a set, loaded once per language
+
+    The bundled list of config/stopwords is used first, then the NLTK corpus
+    if it is installed, else no word is removed.
 
+    Parameters
+    ----------
+    language: str
+        Language used in the conversation, as named by NLTK (e.g. "french")
 
-def get_emoji_counter(data):
+    Returns
+    -------
+    stop_words: frozenset
+        Lower case stop words
+    """
+    _path = os.path.join(STOPWORDS_DIR, language)
+    if os.path.exists(_path):
+        with open(_path, encoding="utf-8") as f:
+            return frozenset(f.read().split())
+
+    if has_nltk_resource("corpora/stopwords"):
+        from nltk.corpus import stopwords
+        if language in stopwords.fileids():
+            return frozenset(stopwords.words(language))
+    return frozenset()
+
+
+@timed
+def get_word_frequencies(data, language="french", chunk_size=100000,
+                         engine="pandas", normalize_plurals=True):
+    """
+    Number of occurrences of each word in the conversation, without the
+    stop words (i.e. common / useless words)
+
+    Parameters
+    ----------
+    data: pd.DataFrame
+        Pre-processed conversation dataframe
+    language: str
+        Language used in the conversation
+    chunk_size: int
+        Number of messages tokenized at once
+    engine: str
+        One of ENGINES, the words are counted by Arrow with any engine
+    normalize_plurals: bool
+        Count a word ending with "s" as the same word without it if both are
+        used, as WordCloud does
+
+    Returns
+    -------
+    frequencies: collections.Counter
+        Lower case word as key, number of occurrences as value
+    """
+    check_engine(engine)
+    messages = data["message"]
+
+    # A word never spans a whitespace : the messages are split by Arrow,
+    # then only the distinct tokens are lowered and searched for words
+    counts = []
+    for i in range(0, len(messages), chunk_size):
+        chunk = pa.array(messages.iloc[i:i + chunk_size], type=pa.string())
+        res = pc.value_counts(pc.list_flatten(pc.utf8_split_whitespace(chunk)))
+        counts.append(pd.Series(res.field("counts").to_numpy(),
+                                index=res.field("values").to_pandas()))
+    if not counts:
+        return Counter()
+    tokens = pd.concat(counts).groupby(level=0).sum()
+    tokens = pd.DataFrame({
+        "word": tokens.index.str.lower().str.findall(WORD_PATTERN),
+        "n": tokens.to_numpy()})
+    counts = tokens.explode("word").dropna().groupby("word")["n"].sum()
+
+    words = counts.index.to_series()
+    stop = words.isin(get_stopwords(language)) | words.str.isdigit()
+    counts, words = counts[~stop.to_numpy()], words[~stop]
+    if normalize_plurals:
+        singular = words.str[:-1]
+        plural = (words.str.endswith("s") & ~words.str.endswith("ss")
+                  & singular.isin(words))
+        counts = counts.groupby(singular.where(plural, words).to_numpy()).sum()
+    return Counter(counts.to_dict())
+
+
+@timed
+def detect_language(data, exclude=(), n_chunks=8, chunk_size=50,
+                    max_chars=2000):
+    """
+    Detect the language of a conversation from a bounded sample of messages
+
+    Chunks of consecutive messages are taken at evenly spaced positions of
+    the conversation, each chunk votes with the probabilities of langdetect,
+    so that the cost does not depend on the size of the conversation.
+
+    Parameters
+    ----------
+    data: pd.DataFrame
+        Pre-processed conversation dataframe
+    exclude: collection of str
+        Messages ignored in the sample (e.g. omitted media placeholders)
+    n_chunks: int
+        Number of chunks of messages voting for a language
+    chunk_size: int
+        Number of consecutive messages in a chunk
+    max_chars: int
+        Maximal number of characters of a chunk given to langdetect
+
+    Returns
+    -------
+    language: str or None
+        ISO 639-1 code of the language (e.g. "fr"), None if no chunk has text
+    confidence: float
+        Mean probability of the language over the chunks, between 0 and 1
+    """
+    from langdetect import DetectorFactory, detect_langs
+    from langdetect.lang_detect_exception import LangDetectException
+
+    # Same sample and same random seed : same result for a conversation
+    DetectorFactory.seed = 0
+    messages = data["message"]
+    last_start = max(len(messages) - chunk_size, 0)
+    starts = np.unique(np.linspace(0, last_start, n_chunks).astype(int))
+
+    votes = Counter()
+    n_votes = 0
+    for start in starts:
+        chunk = messages.iloc[start:start + chunk_size]
+        text = " ".join(m for m in chunk if m not in exclude)[:max_chars]
+        try:
+            languages = detect_langs(text)
+        except LangDetectException:
+            continue
+        n_votes += 1
+        for language in languages:
+            votes[language.lang] += language.prob
+
+    if n_votes == 0:
+        return None, 0.
+    language, score = votes.most_common(1)[0]
+    return language, score / n_votes
+
+
+@timed
+def get_emoji_counter(data, engine="pandas"):
     """
     Count the emoji and distinguish between each participants
 
@@ -222,30 +783,193 @@ def get_emoji_counter(data):
     ----------
     data: pd.DataFrame
         Pre-processed conversation dataframe
+    engine: str
+        One of ENGINES, the emoji are searched in Python with any engine
+        (from the pandas statistics of the conversation)
 
     Returns
     -------
     tmp: pd.DataFrame
         For each participant, emoji used and the associated number of utilisation
     """
-    tmp = []
+    check_engine(engine)
+    tmp = get_conversation_stats(data).emoji_counts.copy()
+    return tmp
 
-    for _, row in data.iterrows():
-        emojis = [s for s in row["message"] if emoji_count(s) == 1]
-        if len(emojis) != 0:
-            for emoji in emojis:
-                tmp.append((row["author"], emoji))
 
-    tmp = pd.Series(tmp).value_counts().reset_index()
-    tmp.columns = ["id", "count"]
-    tmp["author"] = [x[0] for x in tmp["id"]]
-    tmp["emoji"] = [x[1] for x in tmp["id"]]
-    tmp = tmp.drop(columns=["id"])
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday",
+            "Saturday", "Sunday"]
+MONTHS = ["January", "February", "March", "April", "May", "June", "July",
+          "August", "September", "October", "November", "December"]
+# Hours in the order of a clock, from 6h counterclockwise
+CLOCK_HOURS = list(range(6, -1, -1)) + list(range(23, 6, -1))
+# Fields of the dates, coded from 0 : name and labels of their values
+DATE_FIELDS = {
+    "hour": ("hour", range(24)),
+    "weekday": ("day", WEEKDAYS),
+    "month": ("month", MONTHS),
+}
+# Fields of the dates making the time buckets of each granularity
+GRANULARITIES = {
+    "hour": ["hour"],
+    "weekday": ["weekday"],
+    "month": ["month"],
+    "weekday_hour": ["weekday", "hour"],
+}
+
+
+def get_temporal_fields(granularity):
+    """Fields of the dates making the time buckets of a granularity"""
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity: {granularity}")
+    return GRANULARITIES[granularity]
+
+
+def get_temporal_labels(granularity):
+    """
+    Label of each time bucket of a granularity
 
-    return tmp
+    Parameters
+    ----------
+    granularity: str
+        One of "hour", "weekday", "month" or "weekday_hour"
+
+    Returns
+    -------
+    labels: pd.Index
+        Label of each bucket, in the order of the codes
+    """
+    fields = [DATE_FIELDS[field] for field in get_temporal_fields(granularity)]
+    if len(fields) == 1:
+        name, values = fields[0]
+        return pd.Index(values, name=name)
+    names, values = zip(*fields)
+    return pd.MultiIndex.from_product(values, names=names)
+
+
+def encode_temporal_fields(fields, granularity):
+    """
+    Integer code of the time bucket from the fields of the dates
+
+    Parameters
+    ----------
+    fields: mapping
+        Field name as key ("hour", "weekday" or "month"), values coded
+        from 0 as in DATE_FIELDS as value, e.g. a dataframe
+    granularity: str
+        One of "hour", "weekday", "month" or "weekday_hour"
+
+    Returns
+    -------
+    codes: np.ndarray
+        Bucket of each date, between 0 and the number of buckets excluded
+    """
+    names = get_temporal_fields(granularity)
+    return np.ravel_multi_index(
+        [np.asarray(fields[name], dtype=np.intp) for name in names],
+        [len(DATE_FIELDS[name][1]) for name in names])
 
 
-def get_hourly_data(data):
+def get_temporal_codes(dates, granularity):
+    """
+    Integer code of the time bucket of each date
+
+    Parameters
+    ----------
+    dates: pd.Series
+        Dates of the messages
+    granularity: str
+        One of "hour", "weekday", "month" or "weekday_hour"
+
+    Returns
+    -------
+    codes: np.ndarray
+        Bucket of each date, between 0 and the number of buckets excluded
+    """
+    fields = {
+        "hour": lambda: dates.dt.hour.to_numpy(),
+        "weekday": lambda: dates.dt.weekday.to_numpy(),
+        "month": lambda: dates.dt.month.to_numpy() - 1,
+    }
+    return encode_temporal_fields(
+        {name: fields[name]() for name in get_temporal_fields(granularity)},
+        granularity)
+
+
+def build_temporal_histogram(authors, codes, granularity, normalize=True,
+                             weights=None):
+    """
+    Histogram of the messages by participant and time bucket
+
+    Parameters
+    ----------
+    authors: array-like
+        Author of each message, or of each count of messages
+    codes: np.ndarray
+        Time bucket of each message (or count), as get_temporal_codes
+    granularity: str
+        One of "hour", "weekday", "month" or "weekday_hour"
+    normalize: bool
+        Percentage of the messages of each participant if True, else counts
+    weights: array-like
+        Number of messages of each count, one message each if None
+
+    Returns
+    -------
+    res: pd.DataFrame
+        Author as index, time buckets as columns
+    """
+    author_codes, names = pd.factorize(authors, sort=True)
+    labels = get_temporal_labels(granularity)
+
+    # Count matrix of all the (author, bucket) pairs at once
+    n_buckets = len(labels)
+    counts = np.bincount(author_codes * n_buckets + codes, weights=weights,
+                         minlength=len(names) * n_buckets)
+    counts = counts.astype(np.int64).reshape(len(names), n_buckets)
+
+    res = pd.DataFrame(counts,
+                       index=pd.Index(np.asarray(names, dtype=object),
+                                      name="author"),
+                       columns=labels)
+    if normalize:
+        res = (res.div(res.sum(axis=1), axis=0) * 100).round(2)
+    return res
+
+
+@timed
+def get_temporal_histogram(data, granularity, normalize=True, engine="pandas"):
+    """
+    For each participant, number of messages in each time bucket
+    (hour, day of the week, month or day of the week and hour)
+
+    Parameters
+    ----------
+    data: pd.DataFrame
+        Pre-processed conversation dataframe
+    granularity: str
+        One of "hour", "weekday", "month" or "weekday_hour"
+    normalize: bool
+        Percentage of the messages of each participant if True, else counts
+    engine: str
+        Engine computing the statistics, one of ENGINES
+
+    Returns
+    -------
+    res: pd.DataFrame
+        Author as index, time buckets as columns
+    """
+    if engine != "pandas":
+        return get_engine(engine).get_temporal_histogram(data, granularity,
+                                                         normalize)
+
+    codes = get_temporal_codes(data["date"], granularity)
+    return build_temporal_histogram(data["author"], codes, granularity,
+                                    normalize)
+
+
+@timed
+def get_hourly_data(data, engine="pandas"):
     """
     For each hour and each participant, compute the number of message.
     Then normalize for each participant to have hourly distribution
@@ -254,38 +978,22 @@ def get_hourly_data(data):
     ----------
     data: pd.DataFrame
         Pre-processed conversation dataframe
+    engine: str
+        Engine computing the statistics, one of ENGINES
 
     Returns
     -------
     data_copy: pd.DataFrame
-        Normalized message frequency by hour for each participant
-    """
-    # Add hour for each row and count nb of messages for tuple author/hour
-    data_copy = data.copy()
-    data_copy["hour"] = data.apply(lambda x: x["date"].hour, axis=1)
-    data_copy = data_copy[["author", "hour"]]
-    data_copy = data_copy.groupby(["author", "hour"]).size().reset_index()
-    data_copy.columns = ["author", "hour", "count"]
-    data_copy = data_copy.pivot_table(
-        index=["hour"], columns=["author"]).replace(np.nan, 0)
-    data_copy = data_copy.T
-
-    # Add hours not present
-    for hour in range(24):
-        if hour not in data_copy.columns:
-            data_copy[hour] = 0
-
-    # To int & sort columns
-    data_copy = data_copy.astype(int)
-    data_copy = data_copy.reindex(
-        list(range(6, -1, -1)) + list(range(23, 6, -1)), axis=1)
-
-    # Normalize
-    data_copy = (data_copy.div(data_copy.sum(axis=1), axis=0) * 100).round(2)
+        Normalized message frequency by hour for each participant,
+        hours in the order of a clock
+    """
+    data_copy = get_temporal_histogram(data, "hour", engine=engine)
+    data_copy = data_copy[CLOCK_HOURS]
     return data_copy
 
 
-def get_daily_data(data):
+@timed
+def get_daily_data(data, engine="pandas"):
     """
     For each day and each participant, compute the number of message.
     Then normalize for each participant to have daily distribution
@@ -294,35 +1002,20 @@ def get_daily_data(data):
     ----------
     data: pd.DataFrame
         Pre-processed conversation dataframe
+    engine: str
+        Engine computing the statistics, one of ENGINES
 
     Returns
     -------
     data_copy: pd.DataFrame
         Normalized message frequency by day for each participant
     """
-    # Add day for each row and count nb of messages for tuple author/hour
-    data_copy = data.copy()
-    data_copy["day"] = data.apply(lambda x: x["date"].strftime("%A"), axis=1)
-    data_copy = data_copy[["author", "day"]]
-    data_copy = data_copy.groupby(["author", "day"]).size().reset_index()
-    data_copy.columns = ["author", "day", "count"]
-    data_copy = data_copy.pivot_table(
-        index=["day"], columns=["author"]).replace(np.nan, 0)
-    data_copy = data_copy.T
-
-    # Add days not present
-    for day in ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']:
-        if day not in data_copy.columns:
-            data_copy[day] = 0
-
-    # To int & Normalize
-    data_copy = data_copy.astype(int)
-    data_copy = (data_copy.div(data_copy.sum(axis=1), axis=0) * 100).round(2)
-
+    data_copy = get_temporal_histogram(data, "weekday", engine=engine)
     return data_copy
 
 
-def get_monthly_data(data):
+@timed
+def get_monthly_data(data, engine="pandas"):
     """
     For each month and each participant, compute the number of message.
     Then normalize for each participant to have monthly distribution
@@ -331,35 +1024,135 @@ def get_monthly_data(data):
     ----------
     data: pd.DataFrame
         Pre-processed conversation dataframe
+    engine: str
+        Engine computing the statistics, one of ENGINES
 
     Returns
     -------
     data_copy: pd.DataFrame
         Normalized message frequency by month for each participant
     """
-    # Add day for each row and count nb of messages for tuple author/hour
-    data_copy = data.copy()
-    data_copy["month"] = data.apply(lambda x: x["date"].strftime("%B"), axis=1)
-    data_copy = data_copy[["author", "month"]]
-    data_copy = data_copy.groupby(["author", "month"]).size().reset_index()
-    data_copy.columns = ["author", "month", "count"]
-    data_copy = data_copy.pivot_table(index=["month"], columns=[
-                                      "author"]).replace(np.nan, 0)
-    data_copy = data_copy.T
-
-    # Add days not present
-    for month in ["January", "February", "March", "April", "May", "June", "July", "August", "September", "October", "November", "December"]:
-        if month not in data_copy.columns:
-            data_copy[month] = 0
-
-    # To int & Normalize
-    data_copy = data_copy.astype(int)
-    data_copy = (data_copy.div(data_copy.sum(axis=1), axis=0) * 100).round(2)
-
+    data_copy = get_temporal_histogram(data, "month", engine=engine)
     return data_copy
 
 
-def get_mean_media_interval(data, media_message):
+def get_quantile_name(q):
+    """Column of a quantile of the media interval statistics, e.g. q25"""
+    return f"q{round(q * 100)}"
+
+
+def get_empty_media_interval_stats(quantiles=(0.25, 0.75)):
+    """Media interval statistics of a conversation without any message"""
+    columns = ["mean", "median"] + [get_quantile_name(q) for q in quantiles]
+    return pd.DataFrame(columns=columns, index=pd.Index([], name="author"),
+                        dtype="timedelta64[ns]")
+
+
+def to_media_interval_stats(res, authors):
+    """
+    Media interval statistics from their values in nanoseconds
+
+    Parameters
+    ----------
+    res: pd.DataFrame
+        Author as index, statistics in nanoseconds as columns
+    authors: list
+        All the participants, in order of appearance
+
+    Returns
+    -------
+    res: pd.DataFrame
+        Author as index in order of appearance, timedelta columns
+    """
+    res = res.reindex(authors).apply(pd.to_timedelta, unit="ns")
+    res.index.name = "author"
+    return res
+
+
+def format_media_intervals(means):
+    """
+    Mean media interval of each participant as text, the shortest first
+
+    Parameters
+    ----------
+    means: pd.Series
+        Name as index, mean interval (NaT without interval) as value
+
+    Returns
+    -------
+    res: dict
+        Name as key, interval rounded to the hour as value (e.g. "2 days 04")
+    """
+    res = means.dropna().to_dict()
+    return {k: ":".join(str(v.round("H")).split(":")[:-1])
+            for k, v in sorted(res.items(), key=lambda item: item[1])}
+
+
+@timed
+def get_media_interval_stats(data, media_message, burst=timedelta(minutes=30),
+                             quantiles=(0.25, 0.75), engine="pandas"):
+    """
+    For each participant, statistics of the time between sending medias
+
+    The start and the end of the conversation count as medias, and the
+    medias sent less than burst after the previous one are not counted
+    (several medias are often sent at once).
+
+    Parameters
+    ----------
+    data: pd.DataFrame
+        Pre-processed conversation dataframe
+    media_message: str
+        Message value when a media is omitted (language dependant)
+    burst: timedelta
+        Intervals shorter than this duration are ignored
+    quantiles: tuple
+        Quantiles of the intervals to compute, between 0 and 1
+    engine: str
+        Engine computing the statistics, one of ENGINES
+
+    Returns
+    -------
+    res: pd.DataFrame
+        Author as index in order of appearance, timedelta columns mean,
+        median and one per quantile (e.g. q25)
+    """
+    if engine != "pandas":
+        return get_engine(engine).get_media_interval_stats(
+            data, media_message, burst, quantiles)
+    if data.empty:
+        return get_empty_media_interval_stats(quantiles)
+
+    start, end = data["date"].iloc[0], data["date"].iloc[-1]
+    authors = np.asarray(data["author"].unique(), dtype=object)
+    is_media = get_media_mask(data, media_message).to_numpy(dtype=bool)
+    media = data.loc[is_media, ["author", "date"]]
+
+    # Time since the previous media of the author (or the start), then
+    # time between the last media of each author (or the start) and the end
+    by_author = media.groupby("author", observed=True)["date"]
+    previous = by_author.shift().fillna(start)
+    last = by_author.max().reindex(authors).fillna(start)
+    intervals = pd.DataFrame({
+        "author": np.concatenate((media["author"].to_numpy(dtype=object),
+                                  authors)),
+        "interval": np.concatenate(((media["date"] - previous).to_numpy(),
+                                    (end - last).to_numpy())),
+    })
+    intervals = intervals[intervals["interval"] > burst]
+
+    # Aggregate in nanoseconds, all the statistics in one groupby
+    intervals["interval"] = intervals["interval"].to_numpy().astype(np.int64)
+    grouped = intervals.groupby("author", sort=False)["interval"]
+    res = grouped.agg(["mean", "median"])
+    for q in quantiles:
+        res[get_quantile_name(q)] = grouped.quantile(q)
+    return to_media_interval_stats(res, authors)
+
+
+@timed
+def get_mean_media_interval(data, media_message, burst=timedelta(minutes=30),
+                            engine="pandas"):
     """
     For each participant, compute the average time between sending a media
 
@@ -369,34 +1162,16 @@ def get_mean_media_interval(data, media_message):
         Pre-processed conversation dataframe
     media_message: str
         Message value when a media is omitted (language dependant)
+    burst: timedelta
+        Intervals shorter than this duration are ignored
+    engine: str
+        Engine computing the statistics, one of ENGINES
 
     Returns
     -------
     res: dict
         Name as key and mean media interval as value
     """
-    res = {}
-
-    for author in data["author"].unique():
-        # Get media data
-        data_tmp = data[data["author"] == author]
-        data_tmp_media = data_tmp[data_tmp["message"] == media_message]
-
-        # Add first and last message
-        data_tmp_media = pd.concat(
-            (data.iloc[[0]], data_tmp_media), axis=0, ignore_index=True)
-        data_tmp_media = pd.concat(
-            (data_tmp_media, data.iloc[[-1]]), axis=0, ignore_index=True)
-
-        # Get time interval between each media message
-        intervals = (data_tmp_media["date"] -
-                     data_tmp_media["date"].shift()).iloc[1:]
-        # remove media too close (on peut en envoyer plusieurs à la fois avec peu de différence de temps entre deux)
-        intervals = [t for t in intervals if t > timedelta(minutes=30)]
-        mean_media_interval = np.mean(intervals)
-
-        res[author] = mean_media_interval
-
-    res = {k: ":".join(str(v.round("H")).split(":")[:-1])
-           for k, v in sorted(res.items(), key=lambda item: item[1])}
-    return res
+    stats = get_media_interval_stats(data, media_message, burst=burst,
+                                     engine=engine)
+    return format_media_intervals(stats["mean"])
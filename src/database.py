@@ -0,0 +1,459 @@
+import mmap
+import os
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from .data import (CLOCK_HOURS, ConversationStats, build_daily_activity,
+                   build_temporal_histogram, encode_temporal_fields,
+                   format_media_intervals, get_quantile_name,
+                   get_temporal_fields, sort_by_value, to_media_interval_stats)
+from .formats import sniff_format
+from .preprocessing import get_chunk_offsets, get_data_from_buffer
+from .profiling import timed
+from .utils import import_optional
+
+# Oldest DuckDB release supported, as in requirements-engines.txt
+DUCKDB_MIN_VERSION = "0.10"
+
+# Size in bytes of the parts of a conversation file parsed and inserted at once
+INGEST_CHUNK_SIZE = 16 * 1024 ** 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    name VARCHAR PRIMARY KEY,
+    path VARCHAR,
+    header VARCHAR,
+    date_format VARCHAR,
+    media_message VARCHAR
+);
+CREATE TABLE IF NOT EXISTS messages (
+    conversation VARCHAR,
+    position BIGINT,
+    date TIMESTAMP,
+    author VARCHAR,
+    message VARCHAR,
+    length BIGINT,
+    has_question BOOLEAN,
+    has_emoji BOOLEAN
+);
+"""
+
+# Fields of the date of a message, coded as src.data.DATE_FIELDS
+DATE_FIELDS = {
+    "hour": "hour(date)",
+    "weekday": "isodow(date) - 1",
+    "month": "month(date) - 1",
+}
+
+
+class ConversationDatabase:
+    """
+    Conversations stored in a DuckDB database file, analyzed with SQL
+
+    Conversations are parsed and inserted by chunks, and the analytics run
+    in DuckDB which spills to disk beyond its memory limit : archives larger
+    than the memory can be analyzed. Each method gives the same result as
+    the function of src.data with the same name.
+
+    Parameters
+    ----------
+    path: str
+        Path of the database file, in memory if ":memory:"
+    memory_limit: str
+        Maximal memory used by DuckDB, e.g. "2GB", DuckDB default if None
+    """
+
+    def __init__(self, path=":memory:", memory_limit=None):
+        duckdb = import_optional("duckdb", DUCKDB_MIN_VERSION,
+                                 "database engine")
+        config = {} if memory_limit is None else {"memory_limit": memory_limit}
+        self.con = duckdb.connect(path, config=config)
+        self.con.execute(SCHEMA)
+
+    def close(self):
+        self.con.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def query(self, sql, parameters=None):
+        """Result of a SQL query as a pandas DataFrame"""
+        return self.con.execute(sql, parameters).df()
+
+    @timed
+    def add_conversation(self, path, name=None, header=None, date_format=None,
+                         media_message=None, chunk_size=INGEST_CHUNK_SIZE):
+        """
+        Parse a conversation file and insert its messages, chunk by chunk
+
+        Parameters
+        ----------
+        path: str
+            Path of the conversation file
+        name: str
+            Name of the conversation, the file name without extension if None
+        header: str
+            Regex of the date format + the sign separator between date and
+            name. Detected from the beginning of the file with date_format
+            if both are None, else both are required
+        date_format: str
+            Datetime format of the conversation's date.
+            Detected from the beginning of the file with header if None
+        media_message: str
+            Message value when a media is omitted (language dependant).
+            The one of the detected format if None
+        chunk_size: int
+            Size in bytes of the parts of the file parsed at once
+
+        Returns
+        -------
+        name: str
+            Name of the conversation in the database
+        """
+        if (header is None) != (date_format is None):
+            raise ValueError("header and date_format must be given together")
+        if name is None:
+            name = os.path.splitext(os.path.basename(path))[0]
+
+        with open(path, "rb") as f, \
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            if header is None or media_message is None:
+                _, fmt = sniff_format(buffer)
+                if header is None:
+                    header, date_format = fmt["header"], fmt["date_format"]
+                if media_message is None:
+                    media_message = fmt["media_message"]
+
+            self.con.execute("BEGIN TRANSACTION")
+            try:
+                # A conversation added again replaces the previous one
+                self.con.execute("DELETE FROM messages WHERE conversation = ?",
+                                 [name])
+                self.con.execute("INSERT OR REPLACE INTO conversations "
+                                 "VALUES (?, ?, ?, ?, ?)",
+                                 [name, os.path.abspath(path), header,
+                                  date_format, media_message])
+
+                position = 0
+                offsets = get_chunk_offsets(buffer, header, chunk_size)
+                for start, end in zip(offsets[:-1], offsets[1:]):
+                    with memoryview(buffer)[start:end] as view:
+                        data = get_data_from_buffer(view, header, date_format)
+                    self.insert_messages(name, data, position)
+                    position += len(data)
+            except Exception:
+                self.con.execute("ROLLBACK")
+                raise
+            self.con.execute("COMMIT")
+        return name
+
+    def insert_messages(self, conversation, data, position=0):
+        """
+        Insert parsed messages with their features
+
+        Parameters
+        ----------
+        conversation: str
+            Name of the conversation
+        data: pd.DataFrame
+            Pre-processed conversation dataframe
+        position: int
+            Position of the first message in the conversation
+        """
+        features = ConversationStats(data).features
+        chunk = pa.table({
+            "conversation": pa.array([conversation] * len(data), pa.string()),
+            "position": np.arange(position, position + len(data)),
+            "date": pa.array(data["date"]),
+            "author": pa.array(data["author"].astype(str)),
+            "message": pa.array(data["message"], pa.string()),
+            "length": features["length"].to_numpy(),
+            "has_question": features["has_question"].to_numpy(),
+            "has_emoji": features["has_emoji"].to_numpy(),
+        })
+        self.con.register("chunk", chunk)
+        self.con.execute("INSERT INTO messages SELECT * FROM chunk")
+        self.con.unregister("chunk")
+
+    def get_conversations(self):
+        """
+        Conversations of the database
+
+        Returns
+        -------
+        conversations: pd.DataFrame
+            Name, path, format and number of messages of each conversation
+        """
+        return self.query("""
+            SELECT c.*, count(m.position) AS n_messages
+            FROM conversations c
+            LEFT JOIN messages m ON m.conversation = c.name
+            GROUP BY ALL ORDER BY c.name""")
+
+    def get_media_message(self, conversation, media_message=None):
+        """Media placeholder of a conversation, the given one if not None"""
+        if media_message is not None:
+            return media_message
+        return self.con.execute(
+            "SELECT media_message FROM conversations WHERE name = ?",
+            [conversation]).fetchone()[0]
+
+    def get_authors(self, conversation):
+        """Participants of a conversation, in order of appearance"""
+        return self.query("""
+            SELECT author FROM messages WHERE conversation = ?
+            GROUP BY author ORDER BY min(position)""",
+                          [conversation])["author"].tolist()
+
+    @timed
+    def get_author_stats(self, conversation):
+        """
+        All the statistics for each participant, as ConversationStats.by_author
+
+        Parameters
+        ----------
+        conversation: str
+            Name of the conversation
+
+        Returns
+        -------
+        res: pd.DataFrame
+            Author as index in order of appearance, one column per metric:
+            n_messages, n_questions, mean_length, emoji_rate and max_silence
+        """
+        res = self.query("""
+            SELECT author,
+                   count(*) AS n_messages,
+                   sum(has_question::BIGINT)::BIGINT AS n_questions,
+                   avg(length) AS mean_length,
+                   avg(has_emoji::DOUBLE) AS emoji_rate,
+                   coalesce(epoch_ns(max(gap)), 0) AS max_silence
+            FROM (
+                SELECT author, position, length, has_question, has_emoji,
+                       date - lag(date) OVER (PARTITION BY author
+                                              ORDER BY position) AS gap
+                FROM messages WHERE conversation = ?
+            )
+            GROUP BY author ORDER BY min(position)""", [conversation])
+        res["max_silence"] = pd.to_timedelta(res["max_silence"], unit="ns")
+        return res.set_index("author")
+
+    @timed
+    def get_basic_infos(self, conversation, media_message=None):
+        """
+        Basic infos of the conversation, as src.data.get_basic_infos
+
+        Parameters
+        ----------
+        conversation: str
+            Name of the conversation
+        media_message: str
+            Message value when a media is omitted, the one of the
+            conversation format if None
+
+        Returns
+        -------
+        result: dict
+            Basic statistics of the conversation
+        """
+        media_message = self.get_media_message(conversation, media_message)
+        res = self.query("""
+            SELECT min(date) AS start_date, max(date) AS end_date,
+                   count(*) AS n_messages,
+                   count(DISTINCT author) AS n_authors,
+                   count(*) FILTER (WHERE message = ?) AS n_medias
+            FROM messages WHERE conversation = ?""",
+                         [media_message, conversation])
+        result = res.iloc[0].to_dict()
+        for key in ("n_messages", "n_authors", "n_medias"):
+            result[key] = int(result[key])
+        return result
+
+    def get_date_range(self, conversation):
+        """Start/end date of the conversation, as src.data.get_date_range"""
+        infos = self.get_basic_infos(conversation)
+        return (infos["start_date"].strftime('%d/%m/%Y'),
+                infos["end_date"].strftime('%d/%m/%Y'))
+
+    def get_questions_by_name(self, conversation):
+        """Number of questions for each participant, sorted"""
+        n_questions = self.get_author_stats(conversation)["n_questions"]
+        return sort_by_value(n_questions, by_name=False)
+
+    def get_number_of_message(self, conversation):
+        """Total number of messages for each participant, sorted"""
+        return sort_by_value(self.get_author_stats(conversation)["n_messages"])
+
+    def get_maximal_silence_period(self, conversation):
+        """Maximal period without sending a message for each participant"""
+        res = sort_by_value(self.get_author_stats(conversation)["max_silence"])
+        return {k: str(v) for k, v in res.items()}
+
+    def get_mean_message_len(self, conversation):
+        """Mean of the messages size for each participant, sorted"""
+        return sort_by_value(self.get_author_stats(conversation)["mean_length"])
+
+    def percentage_msg_with_emoji(self, conversation):
+        """Proportion of messages with emoji for each participant, sorted"""
+        return sort_by_value(self.get_author_stats(conversation)["emoji_rate"])
+
+    @timed
+    def get_daily_activity(self, conversation, window=1):
+        """
+        For each day and each participant, number of messages summed over a
+        rolling window of days, as src.data.get_daily_activity
+
+        Parameters
+        ----------
+        conversation: str
+            Name of the conversation
+        window: int
+            Number of days summed for each day, 1 for no rolling
+
+        Returns
+        -------
+        res: pd.DataFrame
+            Every day between the first and the last message as index,
+            authors as columns
+        """
+        counts = self.query("""
+            SELECT date_trunc('day', date) AS day, author, count(*) AS n
+            FROM messages WHERE conversation = ?
+            GROUP BY ALL""", [conversation])
+        return build_daily_activity(counts["day"], counts["author"], window,
+                                    counts["n"])
+
+    def get_nb_message_per_day(self, conversation):
+        """Number of messages for each day with messages"""
+        tmp = self.get_daily_activity(conversation).sum(axis=1)
+        tmp = tmp[tmp > 0].rename("date").reset_index()
+        return tmp
+
+    def get_moving_average_nb_message(self, conversation, window=7):
+        """Number of messages summed over a rolling window of days"""
+        tmp = self.get_daily_activity(conversation, window).sum(axis=1)
+        tmp = tmp.rename("date").reset_index()
+        return tmp
+
+    @timed
+    def get_temporal_histogram(self, conversation, granularity,
+                               normalize=True):
+        """
+        For each participant, number of messages in each time bucket, as
+        src.data.get_temporal_histogram
+
+        Parameters
+        ----------
+        conversation: str
+            Name of the conversation
+        granularity: str
+            One of "hour", "weekday", "month" or "weekday_hour"
+        normalize: bool
+            Percentage of the messages of each participant if True,
+            else counts
+
+        Returns
+        -------
+        res: pd.DataFrame
+            Author as index, time buckets as columns
+        """
+        fields = ", ".join(f"{DATE_FIELDS[field]} AS {field}"
+                           for field in get_temporal_fields(granularity))
+        counts = self.query(f"""
+            SELECT author, {fields}, count(*) AS n
+            FROM messages WHERE conversation = ?
+            GROUP BY ALL""", [conversation])
+        codes = encode_temporal_fields(counts, granularity)
+        return build_temporal_histogram(counts["author"], codes, granularity,
+                                        normalize, counts["n"])
+
+    def get_hourly_data(self, conversation):
+        """Percentage of messages by hour, hours in the order of a clock"""
+        return self.get_temporal_histogram(conversation, "hour")[CLOCK_HOURS]
+
+    def get_daily_data(self, conversation):
+        """Percentage of messages by day of the week for each participant"""
+        return self.get_temporal_histogram(conversation, "weekday")
+
+    def get_monthly_data(self, conversation):
+        """Percentage of messages by month for each participant"""
+        return self.get_temporal_histogram(conversation, "month")
+
+    @timed
+    def get_media_interval_stats(self, conversation, media_message=None,
+                                 burst=timedelta(minutes=30),
+                                 quantiles=(0.25, 0.75)):
+        """
+        For each participant, statistics of the time between sending medias,
+        as src.data.get_media_interval_stats
+
+        Parameters
+        ----------
+        conversation: str
+            Name of the conversation
+        media_message: str
+            Message value when a media is omitted, the one of the
+            conversation format if None
+        burst: timedelta
+            Intervals shorter than this duration are ignored
+        quantiles: tuple
+            Quantiles of the intervals to compute, between 0 and 1
+
+        Returns
+        -------
+        res: pd.DataFrame
+            Author as index in order of appearance, timedelta columns mean,
+            median and one per quantile (e.g. q25)
+        """
+        media_message = self.get_media_message(conversation, media_message)
+        columns = "".join(f", quantile_cont(interval, {q}) AS "
+                          f"{get_quantile_name(q)}" for q in quantiles)
+        res = self.query(f"""
+            WITH conversation AS (
+                SELECT * FROM messages WHERE conversation = $conversation
+            ), bounds AS (
+                SELECT arg_min(date, position) AS first_date,
+                       arg_max(date, position) AS last_date
+                FROM conversation
+            ), media AS (
+                SELECT author, date, position FROM conversation
+                WHERE message = $media_message
+            ), intervals AS (
+                SELECT m.author,
+                       epoch_ns(m.date) - epoch_ns(coalesce(
+                           lag(m.date) OVER (PARTITION BY m.author
+                                             ORDER BY m.position),
+                           b.first_date)) AS interval
+                FROM media m, bounds b
+                UNION ALL
+                SELECT a.author,
+                       epoch_ns(b.last_date)
+                       - epoch_ns(coalesce(max(m.date), b.first_date))
+                FROM (SELECT DISTINCT author FROM conversation) a
+                CROSS JOIN bounds b
+                LEFT JOIN media m ON m.author = a.author
+                GROUP BY a.author, b.first_date, b.last_date
+            )
+            SELECT author, avg(interval) AS mean,
+                   quantile_cont(interval, 0.5) AS median{columns}
+            FROM intervals WHERE interval > $burst
+            GROUP BY author""",
+                         {"conversation": conversation,
+                          "media_message": media_message,
+                          "burst": burst // timedelta(microseconds=1) * 1000})
+
+        return to_media_interval_stats(res.set_index("author"),
+                                       self.get_authors(conversation))
+
+    def get_mean_media_interval(self, conversation, media_message=None,
+                                burst=timedelta(minutes=30)):
+        """Average time between sending a media for each participant"""
+        stats = self.get_media_interval_stats(conversation, media_message,
+                                              burst=burst)
+        return format_media_intervals(stats["mean"])
@@ -0,0 +1,168 @@
+import os
+import re
+from datetime import datetime
+from functools import lru_cache
+
+from .utils import load_config
+
+FORMATS_PATH = os.path.join(os.path.dirname(__file__), os.pardir,
+                            "config", "formats.yaml")
+SNIFF_SIZE = 4096
+
+# Anchored layout of a raw message: "Date - Name: message"
+MESSAGE_PATTERN = r"(?P<date>[^\n]*?) - (?P<author>[^\n]*?): (?P<message>.*?)\n?\Z"
+# Same layout up to the message, for raw bytes
+BINARY_MESSAGE_PATTERN = rb"(?P<date>[^\n]*?) - (?P<author>[^\n]*?): "
+
+
+@lru_cache(maxsize=None)
+def compile_message_pattern(header):
+    """
+    Compile the regex extracting date, author and message of a raw message
+
+    Parameters
+    ----------
+    header: str
+        Regex of the date format + the sign separator between date and name,
+        i.e. regex for the part before the names in the conversation
+
+    Returns
+    -------
+    pattern: re.Pattern
+        Anchored pattern with the named groups date, author and message
+    """
+    return re.compile(r"(?=%s)%s" % (header, MESSAGE_PATTERN), re.DOTALL)
+
+
+@lru_cache(maxsize=None)
+def compile_binary_message_pattern(header):
+    """
+    Compile the regex extracting date and author of a raw message in bytes
+
+    Parameters
+    ----------
+    header: str
+        Regex of the date format + the sign separator between date and name,
+        i.e. regex for the part before the names in the conversation
+
+    Returns
+    -------
+    pattern: re.Pattern
+        Anchored bytes pattern with the named groups date and author,
+        the message starts at the end of the match
+    """
+    return re.compile(rb"(?=%s)%s" % (header.encode("utf-8"),
+                                      BINARY_MESSAGE_PATTERN))
+
+
+@lru_cache(maxsize=None)
+def load_formats(path=FORMATS_PATH):
+    """
+    Load the registry of conversation export formats
+
+    Parameters
+    ----------
+    path: str
+        Path of the YAML file describing the formats
+
+    Returns
+    -------
+    formats: dict
+        Format name as key, format description as value (header, date_format,
+        media_message, ...) with its precompiled header pattern
+    """
+    formats = load_config(path)["formats"]
+
+    for fmt in formats.values():
+        fmt["header_pattern"] = re.compile(fmt["header"])
+    return formats
+
+
+def score_format(sample, fmt):
+    """
+    Number of lines of a sample starting with a valid header of a format
+
+    Parameters
+    ----------
+    sample: str
+        Beginning of the conversation file
+    fmt: dict
+        Format description, as returned by load_formats
+
+    Returns
+    -------
+    score: int
+        Number of headers whose date can be parsed with the format
+    """
+    score = 0
+
+    for line in sample.splitlines():
+        match = fmt["header_pattern"].match(line)
+        if match is None:
+            continue
+        date = match.group(0).split(" - ", 1)[0]
+        try:
+            datetime.strptime(date, fmt["date_format"])
+        except ValueError:
+            continue
+        score += 1
+    return score
+
+
+def detect_format(sample, formats=None):
+    """
+    Find the format of a conversation from the beginning of its file
+
+    Parameters
+    ----------
+    sample: str
+        Beginning of the conversation file (a few KB are enough)
+    formats: dict
+        Registry of formats, as returned by load_formats
+
+    Returns
+    -------
+    name: str
+        Name of the best matching format
+    """
+    if formats is None:
+        formats = load_formats()
+
+    scores = {name: score_format(sample, fmt) for name, fmt in formats.items()}
+    name = max(scores, key=scores.get)
+    if scores[name] == 0:
+        raise ValueError("Unknown conversation format")
+    return name
+
+
+def sniff_format(source, formats=None, size=SNIFF_SIZE):
+    """
+    Find the format of a conversation from the beginning of its file
+
+    Parameters
+    ----------
+    source: str or bytes-like
+        Path of the conversation file, or its content (e.g. a memory map
+        or an uploaded buffer)
+    formats: dict
+        Registry of formats, as returned by load_formats
+    size: int
+        Number of bytes read to detect the format
+
+    Returns
+    -------
+    name: str
+        Name of the best matching format
+    fmt: dict
+        Description of this format
+    """
+    if formats is None:
+        formats = load_formats()
+
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            sample = f.read(size)
+    else:
+        sample = bytes(source[:size])
+    name = detect_format(sample.decode("utf-8", errors="ignore"), formats)
+    return name, formats[name]
@@ -0,0 +1,292 @@
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from .data import (build_daily_activity, build_temporal_histogram,
+                   encode_temporal_fields, find_emojis, get_emoji_engine,
+                   get_empty_media_interval_stats, get_quantile_name,
+                   get_temporal_fields, memoize, to_media_interval_stats)
+from .profiling import timed
+from .utils import import_optional
+
+# Oldest Polars release supported (with_row_index, pl.len, gather, ...),
+# as in requirements-engines.txt
+POLARS_MIN_VERSION = "1.0"
+
+_FRAME_CACHE = {}
+_STATS_CACHE = {}
+
+# Fields of a date expression, coded as src.data.DATE_FIELDS
+DATE_FIELDS = {
+    "hour": lambda date: date.dt.hour(),
+    "weekday": lambda date: date.dt.weekday() - 1,
+    "month": lambda date: date.dt.month() - 1,
+}
+
+
+def import_polars():
+    """Import Polars, an optional dependency of this engine"""
+    return import_optional("polars", POLARS_MIN_VERSION, "polars engine")
+
+
+def to_polars(data):
+    """
+    Polars frame of a conversation, converted once per dataframe
+
+    Parameters
+    ----------
+    data: pd.DataFrame
+        Pre-processed conversation dataframe
+
+    Returns
+    -------
+    frame: pl.DataFrame
+        Columns position, date, author (str) and message, plus is_media if
+        present in the dataframe
+    """
+    return memoize(_FRAME_CACHE, data, convert_to_polars)
+
+
+def convert_to_polars(data):
+    pl = import_polars()
+    columns = [column for column in ("date", "author", "message", "is_media")
+               if column in data]
+    frame = pl.from_pandas(data[columns])
+    frame = frame.with_columns(pl.col("author").cast(pl.String))
+    return frame.with_row_index("position")
+
+
+def get_media_expr(data, media_message):
+    """Expression of the messages which are omitted medias, as get_media_mask"""
+    pl = import_polars()
+    if "is_media" in data:
+        return pl.col("is_media")
+    return pl.col("message") == media_message
+
+
+@timed
+def get_author_stats(data):
+    """
+    All the statistics for each participant, as ConversationStats.by_author,
+    memoized for the lifetime of the dataframe
+
+    Parameters
+    ----------
+    data: pd.DataFrame
+        Pre-processed conversation dataframe
+
+    Returns
+    -------
+    res: pd.DataFrame
+        Author as index in order of appearance, one column per metric:
+        n_messages, n_questions, mean_length, emoji_rate and max_silence
+    """
+    return memoize(_STATS_CACHE, data, compute_author_stats)
+
+
+def compute_author_stats(data):
+    pl = import_polars()
+    frame = to_polars(data)
+
+    # Emoji are only searched in messages with a candidate character
+    _, start_pattern = get_emoji_engine()
+    candidates = frame.select(
+        pl.col("message").str.contains(start_pattern.pattern))["message"]
+    emoji_rows = np.flatnonzero(candidates.to_numpy())
+    has_emoji = np.zeros(len(frame), dtype=bool)
+    has_emoji[emoji_rows] = [len(find_emojis(msg)) != 0 for msg in
+                             frame["message"].gather(emoji_rows).to_list()]
+
+    res = (
+        frame.lazy()
+        .with_columns(
+            length=pl.col("message").str.len_chars(),
+            has_question=pl.col("message").str.contains("?", literal=True),
+            has_emoji=pl.Series(has_emoji),
+            gap=pl.col("date").diff().over("author"),
+        )
+        .group_by("author")
+        .agg(
+            n_messages=pl.len().cast(pl.Int64),
+            n_questions=pl.col("has_question").sum().cast(pl.Int64),
+            mean_length=pl.col("length").mean(),
+            emoji_rate=pl.col("has_emoji").mean(),
+            max_silence=pl.col("gap").max().fill_null(timedelta(0)),
+            first=pl.col("position").min(),
+        )
+        .sort("first")
+        .drop("first")
+        .collect()
+    )
+    return res.to_pandas().set_index("author")
+
+
+@timed
+def get_basic_infos(data, media_message):
+    """
+    Basic infos of the conversation, as src.data.get_basic_infos
+
+    Parameters
+    ----------
+    data: pd.DataFrame
+        Pre-processed conversation dataframe
+    media_message: str
+        Message value when a media is omitted (language dependant)
+
+    Returns
+    -------
+    result: dict
+        Basic statistics of the conversation
+    """
+    pl = import_polars()
+    res = to_polars(data).select(
+        start_date=pl.col("date").min(),
+        end_date=pl.col("date").max(),
+        n_messages=pl.len(),
+        n_authors=pl.col("author").n_unique(),
+        n_medias=get_media_expr(data, media_message).sum(),
+    )
+    result = res.row(0, named=True)
+    result["start_date"] = pd.Timestamp(result["start_date"])
+    result["end_date"] = pd.Timestamp(result["end_date"])
+    for key in ("n_messages", "n_authors", "n_medias"):
+        result[key] = int(result[key])
+    return result
+
+
+@timed
+def get_date_range(data):
+    """Start/end date of the conversation, as src.data.get_date_range"""
+    pl = import_polars()
+    res = to_polars(data).select(
+        start_date=pl.col("date").min().dt.strftime("%d/%m/%Y"),
+        end_date=pl.col("date").max().dt.strftime("%d/%m/%Y"),
+    )
+    return res.row(0)
+
+
+@timed
+def get_daily_activity(data, window=1):
+    """
+    For each day and each participant, number of messages summed over a
+    rolling window of days, as src.data.get_daily_activity
+
+    Parameters
+    ----------
+    data: pd.DataFrame
+        Pre-processed conversation dataframe
+    window: int
+        Number of days summed for each day, 1 for no rolling
+
+    Returns
+    -------
+    res: pd.DataFrame
+        Every day between the first and the last message as index,
+        authors as columns
+    """
+    pl = import_polars()
+    counts = (
+        to_polars(data).lazy()
+        .group_by(pl.col("date").dt.truncate("1d").alias("day"), "author")
+        .agg(n=pl.len())
+        .collect()
+        .to_pandas()
+    )
+    return build_daily_activity(counts["day"], counts["author"], window,
+                                counts["n"])
+
+
+@timed
+def get_temporal_histogram(data, granularity, normalize=True):
+    """
+    For each participant, number of messages in each time bucket, as
+    src.data.get_temporal_histogram
+
+    Parameters
+    ----------
+    data: pd.DataFrame
+        Pre-processed conversation dataframe
+    granularity: str
+        One of "hour", "weekday", "month" or "weekday_hour"
+    normalize: bool
+        Percentage of the messages of each participant if True, else counts
+
+    Returns
+    -------
+    res: pd.DataFrame
+        Author as index, time buckets as columns
+    """
+    pl = import_polars()
+    fields = [DATE_FIELDS[field](pl.col("date")).alias(field)
+              for field in get_temporal_fields(granularity)]
+    counts = (
+        to_polars(data).lazy()
+        .group_by("author", *fields)
+        .agg(n=pl.len())
+        .collect()
+        .to_pandas()
+    )
+    codes = encode_temporal_fields(counts, granularity)
+    return build_temporal_histogram(counts["author"], codes, granularity,
+                                    normalize, counts["n"])
+
+
+@timed
+def get_media_interval_stats(data, media_message, burst=timedelta(minutes=30),
+                             quantiles=(0.25, 0.75)):
+    """
+    For each participant, statistics of the time between sending medias,
+    as src.data.get_media_interval_stats
+
+    Parameters
+    ----------
+    data: pd.DataFrame
+        Pre-processed conversation dataframe
+    media_message: str
+        Message value when a media is omitted (language dependant)
+    burst: timedelta
+        Intervals shorter than this duration are ignored
+    quantiles: tuple
+        Quantiles of the intervals to compute, between 0 and 1
+
+    Returns
+    -------
+    res: pd.DataFrame
+        Author as index in order of appearance, timedelta columns mean,
+        median and one per quantile (e.g. q25)
+    """
+    if data.empty:
+        return get_empty_media_interval_stats(quantiles)
+
+    pl = import_polars()
+    frame = to_polars(data)
+    start, end = frame["date"][0], frame["date"][-1]
+    authors = frame.lazy().group_by("author").agg(
+        first=pl.col("position").min()).sort("first").select("author")
+    media = frame.lazy().filter(get_media_expr(data, media_message))
+
+    previous = media.select(
+        "author",
+        interval=pl.col("date")
+        - pl.col("date").shift().over("author").fill_null(start),
+    )
+    last = authors.join(media.group_by("author").agg(pl.col("date").max()),
+                        on="author", how="left")
+    last = last.select(
+        "author", interval=pl.lit(end) - pl.col("date").fill_null(start))
+
+    interval = pl.col("interval").dt.total_nanoseconds()
+    res = (
+        pl.concat([previous, last])
+        .filter(pl.col("interval") > burst)
+        .group_by("author")
+        .agg(interval.mean().alias("mean"),
+             interval.median().alias("median"),
+             *[interval.quantile(q, interpolation="linear").alias(
+                 get_quantile_name(q)) for q in quantiles])
+        .collect()
+        .to_pandas()
+    )
+    return to_media_interval_stats(res.set_index("author"),
+                                   authors.collect()["author"].to_list())
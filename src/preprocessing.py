@@ -1,13 +1,173 @@
+import hashlib
+import json
+import mmap
 import os
 import re
-from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+from pandas.api.types import union_categoricals
 
-from .utils import is_message
+from .cache import CACHE_MAX_SIZE, get_cache_key, load_cached, save_cached
+from .formats import (compile_binary_message_pattern, compile_message_pattern,
+                      sniff_format)
+from .profiling import timed
 
+# To increase whenever the parsed dataframe changes, to invalidate the cache
+PARSER_VERSION = 2
+PARALLEL_CHUNK_SIZE = 64 * 1024 ** 2
+# Messages kept as Python strings while parsing, before their conversion
+PARSE_BATCH_SIZE = 50_000
+# Parquet parts of an incrementally ingested conversation before merging them
+INCREMENTAL_MAX_PARTS = 16
 
-def get_data_from_txt(f, header, date_format):
+# Peak memory of parsing and analyzing a conversation : a fixed part (emoji
+# and language models, lazy imports) plus bytes per byte of its file, fitted
+# on the peak RSS of the benchmark conversations (83 MB + 3.0 per byte,
+# rounded up)
+MEMORY_BASE = 96 * 1024 ** 2
+MEMORY_PER_BYTE = 4
+
+
+def iter_messages(f, header):
+    """
+    Stream the raw messages of a conversation file, one at a time
+
+    Lines are consumed lazily and grouped until the next header, so that
+    multi-line messages are kept together (continuation lines are joined
+    with a space, as if the whole file had been joined).
+
+    Parameters
+    ----------
+    f: io.TextIOWrapper
+        Opened conversation file (any iterable of lines)
+    header: str
+        Regex of the date format + the sign separator between date and name,
+        i.e. regex for the part before the names in the conversation
+
+    Yields
+    ------
+    msg: str
+        A single raw message with date, name and main message
+    """
+    pattern = re.compile(header)
+    buffer = None
+
+    for line in f:
+        parts = pattern.split(line)
+        if buffer is not None and parts[0]:
+            buffer.append(" ")
+            buffer.append(parts[0])
+
+        # Each header found on the line starts a new message
+        for i in range(1, len(parts), 2):
+            if buffer is not None:
+                yield "".join(buffer)
+            buffer = [parts[i], parts[i + 1]]
+
+    if buffer is not None:
+        yield "".join(buffer)
+
+
+def compact_data(data, media_message=None):
+    """
+    Convert a conversation dataframe to its memory-lean schema
+
+    Authors are stored as categories and messages as Arrow strings, which
+    divides the memory of these columns and speeds up groupby on authors.
+
+    Parameters
+    ----------
+    data: pd.DataFrame
+        Dataframe with the three columns date, author and message
+    media_message: str
+        Message value when a media is omitted (language dependant).
+        If given, the boolean column is_media is added
+
+    Returns
+    -------
+    data: pd.DataFrame
+        Dataframe with the compact schema
+    """
+    data = data.astype({"author": "category", "message": "string[pyarrow]"})
+    if media_message is not None:
+        is_media = data["message"] == media_message
+        data["is_media"] = is_media.to_numpy(dtype=bool)
+    return data
+
+
+class ColumnBuilder:
+    """
+    Compact columns of a conversation, built batch by batch while parsing
+
+    The date, author and message strings of at most batch_size messages are
+    kept in Python lists, then converted to datetimes, categories and Arrow
+    strings, so that the peak memory stays close to the size of the final
+    dataframe rather than to the size of the strings of all the messages.
+
+    Parameters
+    ----------
+    date_format: str
+        Datetime format of the conversation's date
+    batch_size: int
+        Number of messages converted at once
+    """
+
+    def __init__(self, date_format, batch_size=PARSE_BATCH_SIZE):
+        self.date_format = date_format
+        self.batch_size = batch_size
+        self.dates, self.authors, self.messages = [], [], []
+        self._batches = []
+
+    def append(self, date, author, message):
+        """Add a message, converting the batch once it is full"""
+        self.dates.append(date)
+        self.authors.append(author)
+        self.messages.append(message)
+        if len(self.dates) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Convert the messages of the current batch to compact columns"""
+        if not self.dates:
+            return
+        dates = pd.to_datetime(pd.Series(self.dates), format=self.date_format)
+        self._batches.append((dates.to_numpy(),
+                              pd.Categorical(self.authors),
+                              pa.array(self.messages, type=pa.string())))
+        self.dates, self.authors, self.messages = [], [], []
+
+    def to_frame(self):
+        """
+        Dataframe of all the messages added
+
+        Returns
+        -------
+        data: pd.DataFrame
+            Three columns date, author (categories) and message (Arrow strings)
+        """
+        self.flush()
+        if not self._batches:
+            return pd.DataFrame({
+                "date": pd.Series([], dtype="datetime64[ns]"),
+                "author": pd.Categorical([]),
+                "message": pd.Series([], dtype="string[pyarrow]"),
+            })
+
+        dates, authors, messages = zip(*self._batches)
+        self._batches = []
+        return pd.DataFrame({
+            "date": np.concatenate(dates),
+            "author": union_categoricals(authors, sort_categories=True),
+            "message": pd.arrays.ArrowStringArray(pa.chunked_array(messages)),
+        })
+
+
+@timed
+def get_data_from_txt(f, header, date_format, media_message=None):
     """
     Get raw data from text conversation file
 
@@ -20,57 +180,295 @@ def get_data_from_txt(f, header, date_format):
         i.e. regex for the part before the names in the conversation
     date_format: str
         Datetime format of the conversation's date
+    media_message: str
+        Message value when a media is omitted (language dependant).
+        If given, the boolean column is_media is added
+
+    Returns
+    -------
+    data: pd.DataFrame
+        Raw dataframe with all message in three columns: date, author and message
+    """
+    pattern = compile_message_pattern(header)
+    columns = ColumnBuilder(date_format)
+
+    # Messages without author (e.g. group events) do not match
+    for msg in iter_messages(f, header):
+        match = pattern.match(msg)
+        if match is not None:
+            columns.append(*match.group("date", "author", "message"))
+
+    return compact_data(columns.to_frame(), media_message)
+
+
+def iter_message_spans(buffer, header):
+    """
+    Stream the positions of the raw messages of a conversation buffer
+
+    Parameters
+    ----------
+    buffer: bytes, mmap.mmap or memoryview
+        Content of the conversation file
+    header: str
+        Regex of the date format + the sign separator between date and name,
+        i.e. regex for the part before the names in the conversation
+
+    Yields
+    ------
+    start, end: int
+        Offsets of the beginning and the end of a raw message
+    """
+    pattern = re.compile(header.encode("utf-8"))
+    start = None
+
+    for match in pattern.finditer(buffer):
+        if start is not None:
+            yield start, match.start()
+        start = match.start()
+
+    if start is not None:
+        yield start, len(buffer)
+
+
+def decode_message(raw):
+    """
+    Decode the bytes of a message body, as it would be read in text mode
+
+    Parameters
+    ----------
+    raw: bytes or memoryview
+        Message body, from the end of the author to the next header
+
+    Returns
+    -------
+    message: str
+        Message send, continuation lines joined with a space
+    """
+    message = str(raw, "utf-8")
+    if "\r" in message:
+        message = message.replace("\r\n", "\n").replace("\r", "\n")
+    if message.endswith("\n"):
+        message = message[:-1]
+    return message.replace("\n", "\n ")
+
+
+@timed
+def get_data_from_buffer(buffer, header, date_format,
+                         media_message=None):
+    """
+    Get raw data from the bytes of a conversation, without copying them
+
+    Headers are searched directly in the buffer and only the date, author and
+    message slices are decoded, without a copy of the whole text. Output is
+    the same as get_data_from_txt.
+
+    Parameters
+    ----------
+    buffer: bytes, mmap.mmap or memoryview
+        Content of the conversation file, e.g. a memory-mapped file or the
+        buffer of an uploaded file
+    header: str
+        Regex of the date format + the sign separator between date and name,
+        i.e. regex for the part before the names in the conversation
+    date_format: str
+        Datetime format of the conversation's date
+    media_message: str
+        Message value when a media is omitted (language dependant).
+        If given, the boolean column is_media is added
 
     Returns
     -------
     data: pd.DataFrame
         Raw dataframe with all message in three columns: date, author and message
     """
-    tmp = []
-    joined = " ".join(f)
-    splitted = re.compile(header).split(joined)[1:]  # premier = vide
-    msgs = [splitted[2 * i] + splitted[2 * i + 1]
-            for i in range(len(splitted) // 2)]
+    pattern = compile_binary_message_pattern(header)
+    columns = ColumnBuilder(date_format)
+
+    # Messages without author (e.g. group events) do not match
+    for start, end in iter_message_spans(buffer, header):
+        match = pattern.match(buffer, start, end)
+        if match is not None:
+            columns.append(str(match.group("date"), "utf-8"),
+                           str(match.group("author"), "utf-8"),
+                           decode_message(buffer[match.end():end]))
+
+    return compact_data(columns.to_frame(), media_message)
 
-    for msg in msgs:
-        if is_message(msg):
-            date_time_obj, author, message = preprocess_row(msg, date_format)
-            to_append = pd.DataFrame([[date_time_obj, author, message]],
-                                     columns=["date", "author", "message"])
-            tmp.append(to_append)
 
-    data = pd.concat(tmp, axis=0).reset_index(drop=True)
+def get_chunk_offsets(buffer, header, chunk_size):
+    """
+    Split a conversation buffer in chunks of about chunk_size bytes, each
+    chunk starting with a message header
+
+    Parameters
+    ----------
+    buffer: bytes or mmap.mmap
+        Content of the conversation file
+    header: str
+        Regex of the date format + the sign separator between date and name
+    chunk_size: int
+        Minimal size of a chunk in bytes
+
+    Returns
+    -------
+    offsets: list
+        Offsets of the chunks, from 0 to the size of the buffer
+    """
+    pattern = re.compile(header.encode("utf-8"))
+    offsets = [0]
+
+    # First header after a line break : headers never contain line breaks,
+    # so it is a header the serial parser finds too
+    while offsets[-1] + chunk_size < len(buffer):
+        line_start = buffer.find(b"\n", offsets[-1] + chunk_size) + 1
+        match = pattern.search(buffer, line_start) if line_start else None
+        if match is None:
+            break
+        offsets.append(match.start())
+
+    offsets.append(len(buffer))
+    return offsets
+
+
+def parse_file_range(path, start, end, header, date_format):
+    """
+    Get raw data from a part of a conversation file, run by parallel workers
+
+    Parameters
+    ----------
+    path: str
+        Path of the conversation file
+    start, end: int
+        Offsets of the part to parse, start being the beginning of a header
+    header: str
+        Regex of the date format + the sign separator between date and name
+    date_format: str
+        Datetime format of the conversation's date
+
+    Returns
+    -------
+    data: pd.DataFrame
+        Raw dataframe with the messages of this part of the file
+    """
+    with open(path, "rb") as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        with memoryview(buffer)[start:end] as view:
+            data = get_data_from_buffer(view, header, date_format)
     return data
 
 
-def preprocess_row(msg, date_format):
+@timed
+def get_data_from_file_parallel(path, header, date_format, media_message=None,
+                                workers=None, chunk_size=PARALLEL_CHUNK_SIZE):
     """
-    Pre-process a single message
+    Get raw data from a conversation file, parsing chunks of the file in a
+    pool of processes. Output is the same as get_data_from_buffer.
 
     Parameters
     ----------
-    msg: str
-        A single message with date, name and main message
+    path: str
+        Path of the conversation file
+    header: str
+        Regex of the date format + the sign separator between date and name,
+        i.e. regex for the part before the names in the conversation
     date_format: str
         Datetime format of the conversation's date
+    media_message: str
+        Message value when a media is omitted (language dependant).
+        If given, the boolean column is_media is added
+    workers: int
+        Number of processes, number of CPUs if None
+    chunk_size: int
+        Size in bytes of the chunks parsed by each task
 
     Returns
     -------
-    date_time_obj: datetime object
-        Date of the message
-    author: str
-        Name of the message sender
-    message: str
-        Message send
+    data: pd.DataFrame
+        Raw dataframe with all message in three columns: date, author and message
+    """
+    with open(path, "rb") as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        offsets = get_chunk_offsets(buffer, header, chunk_size)
+
+    if len(offsets) <= 2:
+        parts = [parse_file_range(path, 0, offsets[-1], header, date_format)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            parts = list(executor.map(parse_file_range, repeat(path),
+                                      offsets[:-1], offsets[1:],
+                                      repeat(header), repeat(date_format)))
+
+    # Categories of each part differ, they are merged by compact_data
+    data = pd.concat(parts, axis=0, ignore_index=True)
+    return compact_data(data, media_message)
+
+
+def estimate_memory(size):
+    """
+    Expected peak memory of parsing and analyzing a conversation
+
+    Parameters
+    ----------
+    size: int
+        Size of the conversation file in bytes
+
+    Returns
+    -------
+    memory: int
+        Expected peak memory in bytes
+    """
+    return MEMORY_BASE + size * MEMORY_PER_BYTE
+
+
+def fit_memory_budget(buffer, header, memory_budget, downgrade=True):
+    """
+    Offset of the most recent messages of a conversation that can be
+    processed within a memory budget
+
+    Parameters
+    ----------
+    buffer: bytes, mmap.mmap or memoryview
+        Content of the conversation file
+    header: str
+        Regex of the date format + the sign separator between date and name
+    memory_budget: int
+        Maximal memory in bytes, no limit if None
+    downgrade: bool
+        Keep the most recent messages if the conversation is too large,
+        else reject it
+
+    Returns
+    -------
+    offset: int
+        Offset of the first message to parse, 0 if the whole conversation
+        fits in the budget
     """
-    date, message = msg.split(" - ", 1)
-    author, message = message.split(": ", 1)
-    message = message[:-2]  # \n and space at the end
-    date_time_obj = datetime.strptime(date, date_format)
-    return date_time_obj, author, message
+    size = len(buffer)
+    if memory_budget is None or estimate_memory(size) <= memory_budget:
+        return 0
 
+    message = (f"Conversation too large for the memory budget : "
+               f"{estimate_memory(size) / 1024 ** 2:.0f} MB expected, "
+               f"{memory_budget / 1024 ** 2:.0f} MB allowed")
+    if not downgrade:
+        raise ValueError(message)
 
-def read_data(data_path, file, header, date_format):
+    # First header at the beginning of a line in the bytes that fit
+    pattern = re.compile(b"\n(?=%s)" % header.encode("utf-8"))
+    max_size = (memory_budget - MEMORY_BASE) // MEMORY_PER_BYTE
+    if max_size <= 0:
+        raise ValueError(message)
+    match = pattern.search(buffer, size - max_size)
+    if match is None:
+        raise ValueError(message)
+    return match.start() + 1
+
+
+@timed
+def read_data(data_path, file, header=None, date_format=None,
+              cache_dir=None, cache_max_size=CACHE_MAX_SIZE, workers=1,
+              chunk_size=PARALLEL_CHUNK_SIZE, memory_budget=None,
+              downgrade=True):
     """
     Get WhatsApp conversation as a pandas DataFrame
 
@@ -82,9 +480,25 @@ def read_data(data_path, file, header, date_format):
         Name of the conversation file
     header: str
         Regex of the date format + the sign separator between date and name,
-        i.e. regex for the part before the names in the conversation
+        i.e. regex for the part before the names in the conversation.
+        Detected from the beginning of the file if None
     date_format: str
-        Datetime format of the conversation's date
+        Datetime format of the conversation's date.
+        Detected from the beginning of the file if None
+    cache_dir: str
+        Directory where parsed conversations are cached, no cache if None
+    cache_max_size: int
+        Maximal size of the cache in bytes
+    workers: int
+        Number of processes parsing the file, None for the number of CPUs
+    chunk_size: int
+        Size in bytes of the chunks parsed by each process
+    memory_budget: int
+        Maximal memory in bytes to parse and analyze the conversation,
+        no limit if None
+    downgrade: bool
+        Keep only the most recent messages fitting in the memory budget if
+        the conversation is too large, else raise a ValueError
 
     Returns
     -------
@@ -92,6 +506,207 @@ def read_data(data_path, file, header, date_format):
         Pre-processed conversation dataframe
     """
     _path = os.path.join(data_path, file)
-    f = open(_path, "r")
-    data = get_data_from_txt(f, header, date_format)
+    with open(_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError("Empty conversation file")
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            if header is None or date_format is None:
+                _, fmt = sniff_format(buffer)
+                header, date_format = fmt["header"], fmt["date_format"]
+
+            offset = fit_memory_budget(buffer, header, memory_budget,
+                                       downgrade)
+
+            if cache_dir is not None:
+                key = get_cache_key(_path, header, date_format, PARSER_VERSION)
+                if offset > 0:
+                    key += f"-{offset}"
+                data = load_cached(cache_dir, key)
+                if data is not None:
+                    return compact_data(data)
+
+            if offset > 0:
+                with memoryview(buffer)[offset:] as view:
+                    data = get_data_from_buffer(view, header, date_format)
+            elif workers == 1:
+                data = get_data_from_buffer(buffer, header, date_format)
+            else:
+                data = get_data_from_file_parallel(_path, header, date_format,
+                                                   workers=workers,
+                                                   chunk_size=chunk_size)
+
+    if cache_dir is not None:
+        save_cached(cache_dir, key, data, max_size=cache_max_size)
+    return data
+
+
+def find_last_header(raw, header):
+    """
+    Byte offset of the last line starting with a header
+
+    Parameters
+    ----------
+    raw: bytes
+        Part of a conversation file
+    header: str
+        Regex of the date format + the sign separator between date and name
+
+    Returns
+    -------
+    offset: int
+        Offset of the beginning of the last message, 0 if there is none
+    """
+    pattern = re.compile(header.encode("utf-8"))
+    end = len(raw)
+
+    # Scan lines backwards, the last message is usually a few lines away
+    while end > 0:
+        start = raw.rfind(b"\n", 0, end - 1) + 1
+        if pattern.match(raw, start):
+            return start
+        end = start
+    return 0
+
+
+def load_parts(state_dir, parts):
+    """Dataframe of the Parquet parts of an incremental ingestion, in order"""
+    frames = [pd.read_parquet(os.path.join(state_dir, part)) for part in parts]
+    return pd.concat(frames, axis=0, ignore_index=True)
+
+
+def remove_parts(state_dir, parts):
+    """Remove the Parquet parts of a previous incremental ingestion"""
+    for part in parts:
+        try:
+            os.remove(os.path.join(state_dir, part))
+        except FileNotFoundError:
+            pass
+
+
+@timed
+def read_data_incremental(data_path, file, state_dir, header=None,
+                          date_format=None):
+    """
+    Get WhatsApp conversation as a pandas DataFrame, only parsing the
+    messages added since the previous call on the same file
+
+    A new export of a conversation is the previous one plus new messages
+    at the end. The dataframe and the byte offset of the last message are
+    stored in state_dir : if the file still starts with the same bytes, only
+    the part after this offset is parsed and appended to the stored dataframe.
+    The last message is always parsed again since it may have been cut.
+
+    The new messages of each ingestion are stored in a new Parquet part, so
+    that writing costs as much as the new messages, and the parts are merged
+    in one when there are more than INCREMENTAL_MAX_PARTS.
+
+    Parameters
+    ----------
+    data_path: str
+        Path where all data are stored
+    file: str
+        Name of the conversation file
+    state_dir: str
+        Directory where the state of the previous ingestions is stored
+    header: str
+        Regex of the date format + the sign separator between date and name,
+        i.e. regex for the part before the names in the conversation.
+        Detected from the beginning of the file if None
+    date_format: str
+        Datetime format of the conversation's date.
+        Detected from the beginning of the file if None
+
+    Returns
+    -------
+    data: pd.DataFrame
+        Pre-processed conversation dataframe
+    """
+    _path = os.path.abspath(os.path.join(data_path, file))
+    name = hashlib.sha1(_path.encode("utf-8")).hexdigest()
+    state_path = os.path.join(state_dir, name + ".json")
+
+    if header is None or date_format is None:
+        _, fmt = sniff_format(_path)
+        header, date_format = fmt["header"], fmt["date_format"]
+
+    with open(_path, "rb") as f:
+        # Resume from the previous ingestion if the file prefix is unchanged
+        state, parts = None, []
+        if os.path.exists(state_path):
+            with open(state_path) as state_file:
+                state = json.load(state_file)
+            parts = state.get("parts", [])
+            if (state["version"], state["header"], state["date_format"]) != \
+                    (PARSER_VERSION, header, date_format) or not parts:
+                state = None
+
+        sha = hashlib.sha256()
+        previous = None
+        if state is not None:
+            prefix = f.read(state["offset"])
+            sha.update(prefix)
+            if len(prefix) == state["offset"] and \
+                    sha.hexdigest() == state["prefix_sha"]:
+                previous = load_parts(state_dir, parts)
+            else:
+                sha = hashlib.sha256()
+                f.seek(0)
+
+        offset = f.tell()
+        tail = f.read()
+
+    # Without a header at the offset, the last stored message goes on
+    if previous is not None and tail and \
+            not re.match(header.encode("utf-8"), tail):
+        previous, sha, offset = None, hashlib.sha256(), 0
+        tail = prefix + tail
+
+    # Parse the new messages, apart from the last one which may grow
+    split = find_last_header(tail, header)
+    tail_view = memoryview(tail)
+    head = get_data_from_buffer(tail_view[:split], header, date_format)
+    last = get_data_from_buffer(tail_view[split:], header, date_format)
+    new = pd.concat((head, last), axis=0, ignore_index=True)
+
+    if previous is not None and len(previous) > 0 and len(new) > 0 and \
+            new["date"].iloc[0] < pd.Timestamp(state["last_date"]):
+        # New messages before the previous ones: not an appended export
+        os.remove(state_path)
+        remove_parts(state_dir, parts)
+        return read_data_incremental(data_path, file, state_dir,
+                                     header, date_format)
+
+    if previous is None:
+        remove_parts(state_dir, parts)
+        previous, parts = head.iloc[:0], []
+    data = compact_data(pd.concat((previous, new), axis=0, ignore_index=True))
+
+    # Only the complete new messages are written, in a part named after
+    # their offset, or all the messages in one part if there are too many
+    os.makedirs(state_dir, exist_ok=True)
+    n_rows = len(previous) + len(head)
+    if len(parts) >= INCREMENTAL_MAX_PARTS:
+        merged = f"{name}-merged-{offset}.parquet"
+        data.iloc[:n_rows].to_parquet(os.path.join(state_dir, merged),
+                                      index=False)
+        stale, parts = parts, [merged]
+    else:
+        stale = []
+        if len(head) or not parts:
+            parts = parts + [f"{name}-{offset}.parquet"]
+            head.to_parquet(os.path.join(state_dir, parts[-1]), index=False)
+
+    # Store the state for the next ingestion
+    sha.update(tail[:split])
+    state = {"version": PARSER_VERSION,
+             "header": header,
+             "date_format": date_format,
+             "offset": offset + split,
+             "prefix_sha": sha.hexdigest(),
+             "parts": parts,
+             "last_date": str(data["date"].iloc[-1]) if len(data) else None}
+    with open(state_path, "w") as state_file:
+        json.dump(state, state_file)
+    remove_parts(state_dir, stale)
     return data
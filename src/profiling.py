@@ -0,0 +1,255 @@
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from functools import wraps
+
+import pandas as pd
+
+# Timings of each thread (i.e. of each Streamlit session run)
+_LOCAL = threading.local()
+
+# Peak and retained memory of the stages are recorded if True
+_MEMORY_ACCOUNTING = False
+
+
+def get_timings():
+    """
+    Timings recorded in the current thread since the last reset
+
+    Returns
+    -------
+    timings: dict
+        Stage name as key, dict with the number of calls, the total wall time
+        in seconds (nested stages included) and the number of rows as value,
+        plus the peak and retained memory and the peak RSS of the process in
+        bytes if accounting is enabled
+    """
+    if not hasattr(_LOCAL, "timings"):
+        _LOCAL.timings = {}
+    return _LOCAL.timings
+
+
+def reset_timings():
+    """Forget the timings recorded in the current thread"""
+    _LOCAL.timings = {}
+
+
+def enable_memory_accounting():
+    """
+    Record the peak and retained memory of each stage with tracemalloc.
+    Allocations are traced in the whole process, which makes it slower
+    and mixes the threads : meant for diagnostics, not production.
+
+    tracemalloc does not see the buffers allocated by Arrow (e.g. the
+    string[pyarrow] messages), so the peak RSS of the process is recorded
+    too. Before Python 3.9 the peak of a stage cannot be reset, it is the
+    peak since the start of the accounting.
+    """
+    global _MEMORY_ACCOUNTING
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+    _MEMORY_ACCOUNTING = True
+
+
+def disable_memory_accounting():
+    """Stop recording the memory of the stages"""
+    global _MEMORY_ACCOUNTING
+    _MEMORY_ACCOUNTING = False
+    tracemalloc.stop()
+    _LOCAL.frames = []
+
+
+def get_memory_frames():
+    """Memory of the stages being run in the current thread, innermost last"""
+    if not hasattr(_LOCAL, "frames"):
+        _LOCAL.frames = []
+    return _LOCAL.frames
+
+
+def get_peak_rss():
+    """
+    Peak resident memory of the process since its start, in bytes,
+    None if unknown (Windows)
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def start_memory_frame():
+    """Start measuring the memory of a stage"""
+    current, peak = tracemalloc.get_traced_memory()
+    frames = get_memory_frames()
+
+    # The peak is reset for the new stage, the enclosing one keeps its own
+    if frames:
+        frames[-1]["peak"] = max(frames[-1]["peak"], peak)
+    if hasattr(tracemalloc, "reset_peak"):
+        tracemalloc.reset_peak()
+    frames.append({"start": current, "peak": current})
+
+
+def stop_memory_frame():
+    """
+    Stop measuring the memory of a stage
+
+    Returns
+    -------
+    peak: int
+        Peak of memory allocated during the stage, in bytes
+    retained: int
+        Memory allocated during the stage and still in use, in bytes
+    peak_rss: int
+        Peak resident memory of the process at the end of the stage, in
+        bytes (None if unknown)
+    """
+    current, peak = tracemalloc.get_traced_memory()
+    frames = get_memory_frames()
+    frame = frames.pop()
+    peak = max(frame["peak"], peak)
+    if frames:
+        frames[-1]["peak"] = max(frames[-1]["peak"], peak)
+    return peak - frame["start"], current - frame["start"], get_peak_rss()
+
+
+def record_timing(name, elapsed, rows=None, memory=None):
+    """
+    Add a call to the timings of a stage
+
+    Parameters
+    ----------
+    name: str
+        Name of the stage
+    elapsed: float
+        Wall time of the call in seconds
+    rows: int
+        Number of rows (messages) processed by the call, if known
+    memory: tuple
+        Peak and retained memory of the call and peak RSS of the process
+        in bytes, if measured
+    """
+    timing = get_timings().setdefault(name, {"calls": 0, "time": 0., "rows": 0})
+    timing["calls"] += 1
+    timing["time"] += elapsed
+    if rows is not None:
+        timing["rows"] += rows
+    if memory is not None:
+        peak, retained, peak_rss = memory
+        timing["peak_memory"] = max(timing.get("peak_memory", 0), peak)
+        timing["retained_memory"] = timing.get("retained_memory", 0) + retained
+        if peak_rss is not None:
+            timing["peak_rss"] = max(timing.get("peak_rss", 0), peak_rss)
+
+
+@contextmanager
+def stage(name, rows=None):
+    """
+    Record the wall time of a block of code as a stage
+
+    Parameters
+    ----------
+    name: str
+        Name of the stage
+    rows: int
+        Number of rows (messages) processed in the block, if known
+    """
+    accounting = _MEMORY_ACCOUNTING
+    if accounting:
+        start_memory_frame()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        memory = stop_memory_frame() if accounting else None
+        record_timing(name, elapsed, rows, memory)
+
+
+@contextmanager
+def profile_run(profile_dir=None):
+    """
+    Record the stages of a run (e.g. a Streamlit script run) from scratch,
+    optionally with cProfile. The profiler is stopped even if the run is
+    interrupted (st.stop, exception), the timings stay readable after it.
+
+    Parameters
+    ----------
+    profile_dir: str
+        Directory of the cProfile dump of the run, not profiled if None
+    """
+    reset_timings()
+    _LOCAL.frames = []
+    profiler = cProfile.Profile() if profile_dir else None
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(
+                os.path.join(profile_dir, f"{time.time_ns()}.prof"))
+        _LOCAL.frames = []
+
+
+def timed(func):
+    """
+    Decorator recording the calls of a function as a stage named
+    "module.function", with the number of rows of its input dataframe
+    (or of its output dataframe for the parsers)
+    """
+    name = f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}"
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        accounting = _MEMORY_ACCOUNTING
+        if accounting:
+            start_memory_frame()
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            memory = stop_memory_frame() if accounting else None
+
+        if args and isinstance(args[0], pd.DataFrame):
+            rows = len(args[0])
+        elif isinstance(result, pd.DataFrame):
+            rows = len(result)
+        else:
+            rows = None
+        record_timing(name, elapsed, rows, memory)
+        return result
+    return wrapper
+
+
+def timings_to_json(timings=None, **infos):
+    """
+    Structured log of timings, one JSON object
+
+    Parameters
+    ----------
+    timings: dict
+        Timings as returned by get_timings, those of the current thread if None
+    **infos:
+        Additional fields of the log (e.g. conversation key, section)
+
+    Returns
+    -------
+    log: str
+        JSON object with the time of the log, the infos and the stages
+    """
+    if timings is None:
+        timings = get_timings()
+    stages = [{"stage": name, **timing} for name, timing in timings.items()]
+    return json.dumps({"timestamp": time.time(), **infos, "stages": stages})
+
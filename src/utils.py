@@ -1,6 +1,7 @@
-import re
+import importlib
 
 import yaml
+from packaging.version import Version
 
 
 def load_config(path):
@@ -10,9 +11,31 @@ def load_config(path):
     return config
 
 
-def is_message(msg):
+
+def import_optional(name, min_version, feature):
     """
-    Test if a string is a message. Supposed to be in the following form :
-    Date - Name: message
+    Import an optional dependency, with a helpful error if it is missing
+    or too old
+
+    Parameters
+    ----------
+    name: str
+        Name of the module, e.g. "duckdb"
+    min_version: str
+        Oldest supported version, as in requirements-engines.txt
+    feature: str
+        Feature requiring the module, for the error message
+
+    Returns
+    -------
+    module: module
+        The imported module
     """
-    return bool(re.search(r'.*-.*:', msg))
+    try:
+        module = importlib.import_module(name)
+    except ImportError:
+        module = None
+    if module is None or Version(module.__version__) < Version(min_version):
+        raise ImportError(f"The {feature} requires {name}>={min_version} : "
+                          f"pip install -r requirements-engines.txt")
+    return module
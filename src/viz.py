@@ -1,17 +1,116 @@
+import base64
+import hashlib
+import io
+import json
+import mimetypes
 import os
+from collections import OrderedDict
+from functools import lru_cache
 
 import matplotlib.pyplot as plt
 import plotly.express as px
 import plotly.graph_objects as go
 import seaborn as sns
-from nltk import word_tokenize
-from nltk.corpus import stopwords
 from PIL import Image
 from wordcloud import WordCloud
 
 from .data import *
+from .profiling import timed
 
+ASSETS_DIR = os.path.join(os.path.dirname(__file__), os.pardir, "assets")
+WORDCLOUD_CACHE_SIZE = 32
 
+# Rendered wordclouds (PNG bytes) by hash of their words and parameters
+_WORDCLOUD_CACHE = OrderedDict()
+
+
+@lru_cache(maxsize=None)
+def get_image_uri(name):
+    """
+    Image of the assets folder as a data URI, read once per process
+
+    Parameters
+    ----------
+    name: str
+        File name of the image in the assets folder
+
+    Returns
+    -------
+    uri: str
+        Base64 data URI, usable as a Plotly image source
+    """
+    mime_type = mimetypes.guess_type(name)[0]
+    with open(os.path.join(ASSETS_DIR, name), "rb") as f:
+        content = base64.b64encode(f.read()).decode("ascii")
+    return f"data:{mime_type};base64,{content}"
+
+
+@lru_cache(maxsize=None)
+def get_image_mask(name):
+    """
+    Image of the assets folder as an array, decoded once per process
+
+    Parameters
+    ----------
+    name: str
+        File name of the image in the assets folder
+
+    Returns
+    -------
+    mask: np.ndarray
+        Read-only pixels of the image
+    """
+    mask = np.array(Image.open(os.path.join(ASSETS_DIR, name)))
+    mask.flags.writeable = False
+    return mask
+
+
+@timed
+def render_wordcloud(frequencies, max_words=100, mask_name="conv.jpg"):
+    """
+    Render a wordcloud as a PNG image, once for the same words and parameters
+
+    Parameters
+    ----------
+    frequencies: dict
+        Word as key, number of occurrences as value
+    max_words: int
+        Maximal number of words in the wordcloud
+    mask_name: str
+        File name of the image in the assets folder giving the shape
+
+    Returns
+    -------
+    png: bytes
+        Wordcloud image in PNG format
+    """
+    # Only the most frequent words are drawn, they are enough as key
+    words = Counter(frequencies).most_common(max_words)
+    params = [words, max_words, mask_name]
+    key = hashlib.sha256(json.dumps(params).encode("utf-8")).hexdigest()
+
+    if key in _WORDCLOUD_CACHE:
+        _WORDCLOUD_CACHE.move_to_end(key)
+        return _WORDCLOUD_CACHE[key]
+
+    cloud = WordCloud(background_color='white',
+                      collocations=False,
+                      max_words=max_words,
+                      mask=get_image_mask(mask_name),
+                      )
+    cloud.generate_from_frequencies(dict(words))
+
+    output = io.BytesIO()
+    cloud.to_image().save(output, format="PNG")
+    png = output.getvalue()
+
+    _WORDCLOUD_CACHE[key] = png
+    if len(_WORDCLOUD_CACHE) > WORDCLOUD_CACHE_SIZE:
+        _WORDCLOUD_CACHE.popitem(last=False)
+    return png
+
+
+@timed
 def plot_messages_per_day(data, show=True):
     """
     Plot the number of message in a conversation for each day
@@ -36,6 +135,7 @@ def plot_messages_per_day(data, show=True):
         return fig
 
 
+@timed
 def plot_moving_nb_messages(data, show=True):
     """
     Plot the moving number of message for a week
@@ -49,7 +149,7 @@ def plot_moving_nb_messages(data, show=True):
     """
     plt.figure(figsize=(14, 5))
     sns.lineplot(data=data, x="day", y="date")
-    plt.ylabel("weekly moving number of message")
+    plt.ylabel("moving number of message")
     plt.xlabel("date")
     if show:
         plt.show()
@@ -58,7 +158,8 @@ def plot_moving_nb_messages(data, show=True):
         return fig
 
 
-def plot_moving_nb_messages_individuals(data, show=True):
+@timed
+def plot_moving_nb_messages_individuals(data, show=True, window=7):
     """
     Plot the moving number of message for a week for each participant in the conversation
 
@@ -68,15 +169,15 @@ def plot_moving_nb_messages_individuals(data, show=True):
         Pre-processed conversation dataframe
     show: bool
         SHow figure if True else return figure object
+    window: int
+        Number of days of the moving period
     """
-    authors = data["author"].unique()
+    activity = get_daily_activity(data, window)
     plt.figure(figsize=(14, 5))
     plt.style.use("seaborn-bright")
 
-    for author in authors:
-        data_author = data[data["author"] == author]
-        tmp = get_moving_average_nb_message(data_author)
-        sns.lineplot(data=tmp, x="day", y="date", label=author)
+    for author in activity.columns:
+        sns.lineplot(x=activity.index, y=activity[author], label=author)
 
     plt.ylabel("moving average number of message")
     plt.xlabel("date")
@@ -88,6 +189,7 @@ def plot_moving_nb_messages_individuals(data, show=True):
         return fig
 
 
+@timed
 def plot_emoji_data(data, show=True):
     """
     Plot the percentage of emoji utilisation
@@ -113,6 +215,7 @@ def plot_emoji_data(data, show=True):
         return fig
 
 
+@timed
 def plot_hourly_data(data, show=True):
     """
     Plot the percentage of message in each hour for each participant
@@ -130,7 +233,7 @@ def plot_hourly_data(data, show=True):
     fig = go.Figure()
 
     for _, row in data_copy.iterrows():
-        author = row.name[-1]
+        author = row.name
         values = row.values
         fig.add_trace(go.Scatterpolar(
             r=values,
@@ -142,10 +245,9 @@ def plot_hourly_data(data, show=True):
     fig.update_polars(angularaxis_type="category",
                       bgcolor="rgba(223, 223, 223, 0)")
 
-    img = Image.open("./assets/clock.png")
     fig.add_layout_image(
         dict(
-            source=img,
+            source=get_image_uri("clock.png"),
             xref="paper",
             yref="paper",
             x=.5,
@@ -167,6 +269,7 @@ def plot_hourly_data(data, show=True):
         return fig
 
 
+@timed
 def plot_daily_data(data, show=True):
     """
     Plot the percentage of message for each day for each participant
@@ -184,7 +287,7 @@ def plot_daily_data(data, show=True):
     fig = go.Figure()
 
     for _, row in data_copy.iterrows():
-        author = row.name[-1]
+        author = row.name
         values = row.values
         fig.add_trace(go.Scatterpolar(
             r=values,
@@ -199,6 +302,7 @@ def plot_daily_data(data, show=True):
         return fig
 
 
+@timed
 def plot_monthly_data(data, show=True):
     """
     Plot the percentage of message for each month, for each participant
@@ -216,7 +320,7 @@ def plot_monthly_data(data, show=True):
     fig = go.Figure()
 
     for _, row in data_copy.iterrows():
-        author = row.name[-1]
+        author = row.name
         values = row.values
         fig.add_trace(go.Scatterpolar(
             r=values,
@@ -231,6 +335,7 @@ def plot_monthly_data(data, show=True):
         return fig
 
 
+@timed
 def plot_percentage_msg_emoji(data, show=True):
     """
     For each participant, plot the percentage of message with one or more emoji
@@ -273,6 +378,7 @@ def plot_percentage_msg_emoji(data, show=True):
         return fig
 
 
+@timed
 def plot_wordcloud(data, language="french", show=True):
     """
     Wordcloud for the most used words in the conversation
@@ -286,22 +392,12 @@ def plot_wordcloud(data, language="french", show=True):
     show: bool
         SHow figure if True else return figure object
     """
-    # Get tokens without stop words
-    all_msg = " ".join(data["message"])
-    tokens = word_tokenize(all_msg)
-    filtered_tokens = [
-        word for word in tokens if word not in stopwords.words(language)]
-    filtered_tokens = " ".join(filtered_tokens)
-
-    # Plot word cloud
-    mask = np.array(Image.open("./assets/conv.jpg"))
-    cloud = WordCloud(background_color='white',
-                      collocations=False,
-                      max_words=100,
-                      mask=mask,
-                      )
+    # Get word frequencies without stop words
+    frequencies = get_word_frequencies(data, language=language)
 
-    cloud.generate(filtered_tokens)
+    # Plot word cloud, rendered only once for the same words
+    png = render_wordcloud(frequencies, max_words=100)
+    cloud = np.array(Image.open(io.BytesIO(png)))
 
     plt.figure(figsize=(18, 8))
     plt.imshow(cloud, interpolation='bilinear')
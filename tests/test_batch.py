@@ -0,0 +1,33 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from batch import main
+from benchmarks.generator import write_conversation
+
+
+def test_batch_keeps_going_after_a_failure(tmp_path):
+    inputs = tmp_path / "inputs"
+    for group in ("family", "friends"):
+        os.makedirs(inputs / group)
+        write_conversation(inputs / group / "chat.txt", 200, fmt="fr",
+                           seed=len(group))
+    with open(inputs / "family" / "events.txt", "w", encoding="utf-8") as f:
+        f.write("10/03/2022 à 19:49 - Alice a ajouté Bob\n")
+
+    output = tmp_path / "results"
+    with pytest.raises(SystemExit, match="1 of 3 conversations failed"):
+        main([str(inputs / "*" / "*.txt"), "--output", str(output),
+              "--workers", "1"])
+
+    # Files with the same name in different directories are both kept
+    conversations = pd.read_parquet(output / "conversations.parquet")
+    assert conversations["conversation"].tolist() == ["family/chat",
+                                                      "friends/chat"]
+    for name in conversations["conversation"]:
+        with open(output / f"{name}.json") as f:
+            assert json.load(f)["conversation"] == name
+    authors = pd.read_parquet(output / "authors.parquet")
+    assert set(authors["conversation"]) == set(conversations["conversation"])
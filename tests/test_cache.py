@@ -0,0 +1,93 @@
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+from src import preprocessing
+from src.cache import load_cached, save_cached
+from src.formats import load_formats
+from src.preprocessing import get_data_from_txt, read_data
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+FORMAT = load_formats()["fr"]
+
+
+@pytest.fixture
+def export(tmp_path):
+    """Copy of the fixture export, which the tests may modify"""
+    path = tmp_path / "conversation.txt"
+    shutil.copy(os.path.join(DATA_DIR, "conversation.txt"), path)
+    return path
+
+
+def parse(path):
+    with open(path, encoding="utf-8") as f:
+        return get_data_from_txt(f, FORMAT["header"], FORMAT["date_format"])
+
+
+def read(path, cache_dir):
+    return read_data(str(path.parent), path.name, cache_dir=str(cache_dir))
+
+
+def forbid_parsing(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("parsed instead of read from the cache")
+    monkeypatch.setattr(preprocessing, "get_data_from_buffer", fail)
+
+
+def test_cache_hit(export, tmp_path, monkeypatch):
+    cache_dir = tmp_path / "cache"
+    expected = parse(export)
+    pd.testing.assert_frame_equal(read(export, cache_dir), expected)
+    assert len(os.listdir(cache_dir)) == 1
+
+    forbid_parsing(monkeypatch)
+    pd.testing.assert_frame_equal(read(export, cache_dir), expected)
+
+
+def test_cache_miss_on_new_content(export, tmp_path):
+    cache_dir = tmp_path / "cache"
+    read(export, cache_dir)
+
+    with open(export, "a", encoding="utf-8") as f:
+        f.write("16/03/2022 à 09:00 - David: Parfait\n")
+    data = read(export, cache_dir)
+    assert data["message"].iloc[-1] == "Parfait"
+    pd.testing.assert_frame_equal(data, parse(export))
+    assert len(os.listdir(cache_dir)) == 2
+
+
+def test_cache_invalidated_by_parser_version(export, tmp_path, monkeypatch):
+    cache_dir = tmp_path / "cache"
+    read(export, cache_dir)
+    (old_entry,) = os.listdir(cache_dir)
+
+    monkeypatch.setattr(preprocessing, "PARSER_VERSION",
+                        preprocessing.PARSER_VERSION + 1)
+    calls = []
+    parser = preprocessing.get_data_from_buffer
+    monkeypatch.setattr(preprocessing, "get_data_from_buffer",
+                        lambda *args: calls.append(args) or parser(*args))
+    pd.testing.assert_frame_equal(read(export, cache_dir), parse(export))
+    assert len(calls) == 1
+
+    # Entries of the previous versions are evicted
+    (entry,) = os.listdir(cache_dir)
+    assert entry != old_entry
+    assert entry.startswith(f"v{preprocessing.PARSER_VERSION}-")
+
+
+def test_least_recently_used_entries_are_evicted(export, tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    data = parse(export)
+    for i, key in enumerate(["v1-a", "v1-b"]):
+        save_cached(cache_dir, key, data)
+        os.utime(os.path.join(cache_dir, key + ".parquet"), (i, i))
+    size = os.path.getsize(os.path.join(cache_dir, "v1-a.parquet"))
+
+    # v1-a is used, v1-b becomes the least recently used entry
+    assert load_cached(cache_dir, "v1-a") is not None
+    save_cached(cache_dir, "v1-c", data, max_size=2 * size + size // 2)
+    assert sorted(os.listdir(cache_dir)) == ["v1-a.parquet", "v1-c.parquet"]
+    assert load_cached(cache_dir, "v1-b") is None
@@ -0,0 +1,99 @@
+import pandas as pd
+import pytest
+
+from src.data import (ENGINES, ConversationStats, find_emojis,
+                      get_date_range, get_emoji_counter, get_emoji_engine,
+                      get_mean_media_interval,
+                      get_media_interval_stats, get_temporal_codes,
+                      get_temporal_labels, get_word_frequencies,
+                      sort_by_value)
+
+MEDIA_MESSAGE = "<Médias omis>"
+
+
+def make_conversation(messages, authors=("Alice", "Bob", "Chloé")):
+    """Conversation dataframe with one message per hour"""
+    return pd.DataFrame({
+        "date": pd.date_range("2022-03-10 19:00", periods=len(messages),
+                              freq="H"),
+        "author": [authors[i % len(authors)] for i in range(len(messages))],
+        "message": messages,
+    })
+
+
+def test_digits_are_not_emoji_candidates():
+    _, start_pattern = get_emoji_engine()
+    for message in ["rdv à 20h30", "code 1234 #5 *7", "le 12/05/2022"]:
+        assert start_pattern.search(message) is None
+    for message in ["1️⃣", "#⃣", "*️⃣ ok", "9⃣", "©", "👍"]:
+        assert start_pattern.search(message) is not None
+
+
+def test_emoji_of_a_digit_heavy_conversation():
+    messages = ["rdv à 20h30 le 12/05", "1️⃣ 2⃣ #️⃣ *⃣ 10 👍🏽",
+                "code 1234 #5 *7", "🇫🇷 et 3️⃣", "9️", "©2022 👨‍👩‍👧"] * 10
+    stats = ConversationStats(make_conversation(messages))
+
+    # Only the messages with an emoji are searched
+    assert len(stats._emoji_rows) == 30
+    expected = [len(find_emojis(message)) != 0 for message in messages]
+    assert stats.features["has_emoji"].tolist() == expected
+
+    counts = stats.emoji_counts.groupby("emoji")["count"].sum().to_dict()
+    assert counts == {"1️⃣": 10, "2⃣": 10, "#️⃣": 10, "*⃣": 10, "👍🏽": 10,
+                      "🇫🇷": 10, "3️⃣": 10, "©": 10, "👨‍👩‍👧": 10}
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_media_intervals_of_an_empty_conversation(engine):
+    if engine != "pandas":
+        pytest.importorskip(engine)
+    data = make_conversation([])
+
+    stats = get_media_interval_stats(data, MEDIA_MESSAGE, engine=engine)
+    assert stats.empty
+    assert list(stats.columns) == ["mean", "median", "q25", "q75"]
+    assert get_mean_media_interval(data, MEDIA_MESSAGE, engine=engine) == {}
+
+
+def test_sort_by_value_ties():
+    values = pd.Series({"Chloé": 2, "Bob": 5, "Alice": 2, "David": 1})
+    assert list(sort_by_value(values)) == ["Bob", "Alice", "Chloé", "David"]
+    assert list(sort_by_value(values, by_name=False)) == ["Bob", "Chloé",
+                                                          "Alice", "David"]
+
+
+def test_temporal_codes_match_labels():
+    dates = pd.Series(pd.to_datetime(["2022-03-14 00:10", "2022-03-20 23:50",
+                                      "2022-12-16 13:00"]))
+    labels = get_temporal_labels("weekday_hour")
+    codes = get_temporal_codes(dates, "weekday_hour")
+    assert list(labels[codes]) == [("Monday", 0), ("Sunday", 23),
+                                   ("Friday", 13)]
+    assert list(get_temporal_labels("month")[
+        get_temporal_codes(dates, "month")]) == ["March", "March", "December"]
+    with pytest.raises(ValueError):
+        get_temporal_labels("minute")
+
+
+def test_unknown_engine():
+    data = make_conversation(["salut 👋", "ça va ?"])
+    for func in (get_date_range, get_emoji_counter):
+        with pytest.raises(ValueError):
+            func(data, engine="spark")
+
+
+@pytest.mark.parametrize("dtype", [object, "string[pyarrow]"])
+def test_word_frequencies(dtype):
+    messages = ["Les billets ? 2 billets, l'hôtel…", "Un billet\ntrain 🚆",
+                "Classe : chambres ou chambre", "It's the class 👍"]
+    data = make_conversation(pd.Series(messages, dtype=dtype))
+
+    assert get_word_frequencies(data, "french") == {
+        "billet": 3, "l'hôtel": 1, "train": 1, "classe": 1, "chambre": 2,
+        "it's": 1, "the": 1, "class": 1}
+    assert get_word_frequencies(data, "french", chunk_size=1,
+                                normalize_plurals=False)["billets"] == 2
+
+    # Stop words of WordCloud, as the clouds used to remove them
+    assert "it's" not in get_word_frequencies(data, "english")
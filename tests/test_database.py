@@ -0,0 +1,50 @@
+import os
+
+import pytest
+
+from src.formats import load_formats
+
+duckdb = pytest.importorskip("duckdb")
+from src.database import ConversationDatabase  # noqa: E402
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+PATH = os.path.join(DATA_DIR, "conversation.txt")
+
+
+@pytest.fixture
+def db():
+    with ConversationDatabase() as db:
+        yield db
+
+
+def test_failed_insertion_is_rolled_back(db):
+    name = db.add_conversation(PATH)
+    n_messages = db.get_basic_infos(name)["n_messages"]
+    fmt = load_formats()["fr"]
+
+    # Headers found, dates which cannot be parsed
+    with pytest.raises(ValueError):
+        db.add_conversation(PATH, header=fmt["header"], date_format="%Y")
+    assert db.get_basic_infos(name)["n_messages"] == n_messages
+    assert db.get_conversations()["date_format"].tolist() == \
+        [fmt["date_format"]]
+
+    # No transaction left open
+    assert db.add_conversation(PATH, name="again") == "again"
+
+
+def test_header_without_date_format(db):
+    fmt = load_formats()["fr"]
+    with pytest.raises(ValueError):
+        db.add_conversation(PATH, header=fmt["header"])
+    assert db.get_conversations().empty
+
+
+def test_failed_deletion_is_rolled_back(db):
+    db.con.execute("DROP TABLE messages")
+    with pytest.raises(duckdb.Error):
+        db.add_conversation(PATH)
+
+    # No transaction left open
+    db.con.execute("BEGIN TRANSACTION")
+    db.con.execute("ROLLBACK")
@@ -0,0 +1,48 @@
+import inspect
+import os
+import subprocess
+import sys
+
+import pytest
+
+import src
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(src.__file__)))
+
+
+def run_python(code):
+    """Output of a Python snippet run in a fresh interpreter at the root"""
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+    return result.stdout.split()
+
+
+def test_import_does_not_load_the_plots():
+    assert run_python(
+        "import sys, src; "
+        "print('matplotlib' in sys.modules, hasattr(src, 'foo'), "
+        "'matplotlib' in sys.modules)") == ["False", "False", "False"]
+
+
+def test_viz_module_on_first_use():
+    assert run_python(
+        "import sys, src; viz = src.viz; "
+        "print(viz is sys.modules['src.viz'], "
+        "src.plot_messages_per_day is viz.plot_messages_per_day)"
+    ) == ["True", "True"]
+
+
+def test_viz_names_are_the_plotting_functions():
+    viz = src.viz
+    functions = {name for name, value in vars(viz).items()
+                 if inspect.isfunction(inspect.unwrap(value))
+                 and getattr(value, "__module__", None) == viz.__name__
+                 and not name.startswith("_")}
+    assert src.VIZ_NAMES == functions
+
+
+def test_unknown_attribute():
+    with pytest.raises(AttributeError):
+        src.plot_nothing
+    with pytest.raises(AttributeError):
+        src._private
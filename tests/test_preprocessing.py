@@ -0,0 +1,187 @@
+import io
+import json
+import os
+import re
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from src.formats import load_formats
+from src import preprocessing
+from src.preprocessing import (find_last_header, get_chunk_offsets,
+                               get_data_from_buffer,
+                               get_data_from_file_parallel, get_data_from_txt,
+                               read_data_incremental)
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+PATH = os.path.join(DATA_DIR, "conversation.txt")
+FORMAT = load_formats()["fr"]
+# Event closing the fixture, so that its last message ends like the others
+LAST_EVENT = "15/03/2022 à 12:47 - Alice a quitté le groupe\n"
+
+
+def read_text(path=PATH):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def parse_text(text):
+    """Conversation parsed by get_data_from_txt from its text"""
+    return get_data_from_txt(io.StringIO(text), FORMAT["header"],
+                             FORMAT["date_format"])
+
+
+def parse_joined(text, header, date_format):
+    """Former parser : whole file joined, split on headers, one row each"""
+    joined = " ".join(io.StringIO(text))
+    splitted = re.compile(header).split(joined)[1:]
+    rows = []
+    for i in range(len(splitted) // 2):
+        msg = splitted[2 * i] + splitted[2 * i + 1]
+        if re.search(r".*-.*:", msg):
+            date, message = msg.split(" - ", 1)
+            author, message = message.split(": ", 1)
+            rows.append([datetime.strptime(date, date_format), author,
+                         message[:-2]])
+    return pd.DataFrame(rows, columns=["date", "author", "message"])
+
+
+def assert_same_messages(data, expected):
+    """Same messages, whatever the dtypes of the columns"""
+    pd.testing.assert_frame_equal(data.astype(object),
+                                  expected.astype(object))
+
+
+def test_same_output_as_the_joined_parser():
+    text = read_text() + LAST_EVENT
+    data = parse_text(text)
+    expected = parse_joined(text, FORMAT["header"], FORMAT["date_format"])
+
+    assert len(data) == 15
+    assert_same_messages(data, expected)
+    assert data["message"][2] == ("Le 12/05 à 20h30 :\n - billets : 2 x 45 €"
+                                  "\n - hôtel : à réserver")
+    assert data["message"][7] == ("Moi ! 1️⃣ chambre ou 2️⃣ ?\n \n "
+                                  "Deux, c'est mieux")
+
+
+@pytest.mark.parametrize("end", ["\n", ""])
+def test_last_message_is_complete(end):
+    text = read_text().rstrip("\n") + end
+    assert parse_text(text)["message"].iloc[-1] == "Billets pris 🚆"
+
+
+def test_chunks_give_the_serial_result():
+    with open(PATH, "rb") as f:
+        buffer = f.read()
+    expected = parse_text(read_text())
+    header_pattern = re.compile(FORMAT["header"].encode("utf-8"))
+
+    for chunk_size in range(1, len(buffer) + 2, 7):
+        offsets = get_chunk_offsets(buffer, FORMAT["header"], chunk_size)
+        assert offsets[0] == 0 and offsets[-1] == len(buffer)
+        for offset in offsets[1:-1]:
+            assert buffer[offset - 1:offset] == b"\n"
+            assert header_pattern.match(buffer, offset)
+
+        parts = [get_data_from_buffer(buffer[start:end], FORMAT["header"],
+                                      FORMAT["date_format"])
+                 for start, end in zip(offsets[:-1], offsets[1:])]
+        data = pd.concat(parts, ignore_index=True)
+        assert_same_messages(data, expected)
+
+
+def test_parallel_parse():
+    with open(PATH, encoding="utf-8") as f:
+        expected = get_data_from_txt(f, FORMAT["header"],
+                                     FORMAT["date_format"],
+                                     FORMAT["media_message"])
+    data = get_data_from_file_parallel(PATH, FORMAT["header"],
+                                       FORMAT["date_format"],
+                                       FORMAT["media_message"], workers=2,
+                                       chunk_size=256)
+    pd.testing.assert_frame_equal(data, expected)
+
+
+def test_find_last_header():
+    raw = read_text().encode("utf-8")
+    assert raw[find_last_header(raw, FORMAT["header"]):] == \
+        "15/03/2022 à 12:46 - Bob Martin: Billets pris 🚆\n".encode("utf-8")
+
+    # Continuation lines belong to the last message
+    raw = raw[:raw.index(b"Deux, c'est mieux\n") + 18]
+    assert raw[find_last_header(raw, FORMAT["header"]):].startswith(
+        "11/03/2022 à 08:20 - David: Moi !".encode("utf-8"))
+    assert find_last_header(b"no header\nat all\n", FORMAT["header"]) == 0
+
+
+def write_export(path, text):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def ingest(path, state_dir):
+    return read_data_incremental(str(path.parent), path.name, state_dir,
+                                 FORMAT["header"], FORMAT["date_format"])
+
+
+def read_state(state_dir):
+    (state_file,) = [file for file in os.listdir(state_dir)
+                     if file.endswith(".json")]
+    with open(os.path.join(state_dir, state_file)) as f:
+        return json.load(f)
+
+
+def test_incremental_ingestion_of_a_grown_export(tmp_path):
+    text = read_text()
+    expected = parse_text(text)
+    path, state_dir = tmp_path / "export.txt", str(tmp_path / "state")
+
+    # Previous exports cut anywhere, even in the middle of a message
+    for cut in range(0, len(text), 13):
+        write_export(path, text[:cut])
+        before = ingest(path, state_dir)
+        assert_same_messages(before, parse_text(text[:cut]))
+
+        write_export(path, text)
+        data = ingest(path, state_dir)
+        assert_same_messages(data, expected)
+        assert data["author"].dtype == "category"
+
+    # The parsed prefix is not parsed again
+    state = read_state(state_dir)
+    assert 0 < state["offset"] < len(text.encode("utf-8"))
+    assert len(state["parts"]) == 2
+
+
+def test_incremental_ingestion_of_a_new_export(tmp_path):
+    text = read_text()
+    path, state_dir = tmp_path / "export.txt", str(tmp_path / "state")
+    write_export(path, text)
+    ingest(path, state_dir)
+
+    # Edited prefix : everything is parsed again
+    edited = text.replace("Salut tout le monde", "Bonjour à tous") + LAST_EVENT
+    write_export(path, edited)
+    data = ingest(path, state_dir)
+    assert_same_messages(data, parse_text(edited))
+    assert len(read_state(state_dir)["parts"]) == 1
+
+
+def test_incremental_parts_are_merged(tmp_path, monkeypatch):
+    monkeypatch.setattr(preprocessing, "INCREMENTAL_MAX_PARTS", 3)
+    lines = read_text().splitlines(keepends=True)
+    path, state_dir = tmp_path / "export.txt", str(tmp_path / "state")
+
+    for n_lines in range(1, len(lines) + 1):
+        text = "".join(lines[:n_lines])
+        write_export(path, text)
+        data = ingest(path, state_dir)
+        assert_same_messages(data, parse_text(text))
+
+        # Parts of the state only, the merged ones are removed
+        parts = read_state(state_dir)["parts"]
+        assert len(parts) <= 4
+        assert sorted(parts) == sorted(file for file in os.listdir(state_dir)
+                                       if file.endswith(".parquet"))
@@ -0,0 +1,44 @@
+import tracemalloc
+
+import pytest
+
+from src import profiling
+
+
+@pytest.fixture
+def memory_accounting():
+    profiling.reset_timings()
+    profiling.enable_memory_accounting()
+    yield profiling.get_timings()
+    profiling.disable_memory_accounting()
+
+
+@pytest.mark.parametrize("reset_peak", [True, False])
+def test_memory_of_nested_stages(memory_accounting, monkeypatch, reset_peak):
+    if not reset_peak:
+        # Python 3.8 : tracemalloc.reset_peak does not exist
+        monkeypatch.delattr(tracemalloc, "reset_peak")
+
+    with profiling.stage("outer"):
+        outer = bytearray(4 * 1024 ** 2)
+        with profiling.stage("inner"):
+            inner = bytearray(2 * 1024 ** 2)
+
+    assert memory_accounting["inner"]["peak_memory"] >= 2 * 1024 ** 2
+    assert memory_accounting["outer"]["peak_memory"] >= 6 * 1024 ** 2
+    assert memory_accounting["outer"]["retained_memory"] >= 6 * 1024 ** 2
+    assert memory_accounting["outer"]["peak_rss"] > 0
+    del outer, inner
+
+
+def test_profile_run_is_stopped_by_an_interruption(tmp_path):
+    profiling.record_timing("previous run", 1.)
+    with pytest.raises(RuntimeError):
+        with profiling.profile_run(str(tmp_path)):
+            with profiling.stage("interrupted"):
+                raise RuntimeError("st.stop")
+
+    assert list(profiling.get_timings()) == ["interrupted"]
+    assert profiling.get_memory_frames() == []
+    (dump,) = tmp_path.iterdir()
+    assert dump.suffix == ".prof"